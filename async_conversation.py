@@ -0,0 +1,138 @@
+import asyncio
+import time
+import openai
+from mosaic import MOSAIC_TOKEN_BUDGET
+from conversation_with_gpt import (
+    list_image_groups, apply_tracking, prepare_group_images, build_group_message, estimate_request_tokens, _record_request, _strip_images,
+    _used_tokens,
+)
+from rate_limit import TokenBucketLimiter
+from metrics import METRICS, timed
+from request_executor import EXECUTOR
+
+
+async def _send_group(client, limiter, semaphore, idx, total, group, prompt, model, log_slots, response_cache, image_options,
+                      journal):
+    if journal is not None and journal.group_reply(idx) is not None:
+        print(f"↩️ Group {idx + 1}/{total} restored from journal")
+        user_message = await asyncio.to_thread(build_group_message, group, prompt, *image_options)
+        return _strip_images(user_message), journal.group_reply(idx)
+
+    async with semaphore:
+        # Images are prepared up front, but a cache miss may still encode; keep it off the event loop
+        user_message = await asyncio.to_thread(build_group_message, group, prompt, *image_options)
+        messages = [user_message]
+
+        if response_cache is not None:
+            cached = response_cache.get(model, messages, 0.3, 1000)
+            if cached is not None:
+                log_slots[idx] = _record_request(None, f"group {idx + 1}", messages, cached, 0.0, cached=True)
+                return _strip_images(user_message), cached.choices[0].message.content
+
+        estimated_tokens = estimate_request_tokens(messages)
+        wait_start = time.time()
+        await limiter.acquire(estimated_tokens)
+        METRICS.add("gpt.rate_limit_wait", time.time() - wait_start)
+        print(f"📤 Sending group {idx + 1}/{total} to GPT...")
+
+        start = time.time()
+        response = await EXECUTOR.create_async(
+            client,
+            label=f"group {idx + 1}",
+            estimated_tokens=estimated_tokens,
+            model=model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=1000
+        )
+
+        entry = _record_request(None, f"group {idx + 1}", messages, response, time.time() - start)
+        METRICS.add("gpt.request", entry["latency_seconds"])
+        limiter.settle(estimated_tokens, _used_tokens(response))
+        if response_cache is not None:
+            response_cache.put(model, messages, 0.3, 1000, response)
+        log_slots[idx] = entry
+        if journal is not None:
+            journal.record_group(idx, response.choices[0].message.content, entry)
+        # Only the reply is needed from here on; drop the base64 images right away
+        return _strip_images(user_message), response.choices[0].message.content
+
+
+async def _run_groups(grouped, prompts, model, max_concurrency, limiter, usage_log, base_url, response_cache, image_options,
+                      journal):
+    # Retries are handled by EXECUTOR, so the client itself must not retry as well
+    client = openai.AsyncOpenAI(api_key=openai.api_key, base_url=base_url, max_retries=0)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    total = len(grouped)
+    log_slots = [None] * total
+
+    try:
+        results = await asyncio.gather(*(
+            _send_group(client, limiter, semaphore, idx, total, group, prompts[idx], model, log_slots, response_cache, image_options,
+                        journal)
+            for idx, group in enumerate(grouped)
+        ))
+    finally:
+        await client.close()
+
+    if usage_log is not None:
+        usage_log.extend(entry for entry in log_slots if entry is not None)
+    return results
+
+
+def start_conversation_async(folder_name: str, group_size: int, prompt: str, rate_limiter=None, model: str = "gpt-4.1-mini",
+                             max_concurrency: int = 4, usage_log=None, base_url=None, response_cache=None,
+                             image_max_size: int = 800, jpeg_quality: int = 85,
+                             dedup_method: str = None, dedup_threshold=None, dedup_report=None, journal=None,
+                             payload_mode: str = "full", roi_padding: float = 0.15, roi_class_id=None,
+                             payload_report=None, mosaic_tokens: int = MOSAIC_TOKEN_BUDGET,
+                             track_format: str = None, send_on_change: bool = True, track_images: bool = True,
+                             tracking_report=None):
+    """
+    Sends independent image groups concurrently and returns results in group order.
+
+    Only valid for context_policy="none": every group is sent on its own, so no
+    request has to wait for the previous reply.
+
+    Parameters:
+        - folder_name: frame folder under output/
+        - group_size: number of images per GPT message
+        - prompt: prompt for each group of images
+        - rate_limiter: shared TokenBucketLimiter (a 20 requests/min limiter is created if None)
+        - model: model name to use for completion
+        - max_concurrency: maximum number of requests in flight
+        - usage_log: optional list that receives per-request bytes and token usage (in group order)
+        - base_url: optional API base URL, e.g. a local mock endpoint
+        - response_cache: optional ResponseCache answering repeated groups from disk
+        - image_max_size / jpeg_quality: size and quality the frames are re-encoded at
+        - dedup_method / dedup_threshold / dedup_report: near-duplicate frame removal (see list_image_groups)
+        - journal: optional RunJournal; groups are journaled as they complete and journaled ones are skipped
+        - payload_mode / roi_padding / roi_class_id / payload_report / mosaic_tokens: full frames, ROI crops or
+          one mosaic per group (see prepare_group_images)
+        - track_format / send_on_change / track_images / tracking_report: tracking summaries and
+          skipping of unchanged groups (see apply_tracking)
+
+    Returns:
+        - message_history: user/assistant turns in group order (images already dropped)
+        - summaries: list of GPT responses for each image group
+    """
+    grouped = list_image_groups(folder_name, group_size, dedup_method, dedup_threshold, dedup_report, prompt)
+    grouped, prompts = apply_tracking(folder_name, grouped, prompt, track_format, send_on_change, track_images,
+                                      tracking_report)
+    crops = prepare_group_images(folder_name, grouped, image_max_size, jpeg_quality, payload_mode, roi_padding,
+                                 roi_class_id, payload_report, mosaic_tokens)
+    mosaic = mosaic_tokens if payload_mode == "mosaic" else None
+    limiter = rate_limiter if rate_limiter is not None else TokenBucketLimiter(requests_per_minute=20)
+
+    with timed("gpt.groups"):
+        results = asyncio.run(_run_groups(grouped, prompts, model, max_concurrency, limiter, usage_log, base_url, response_cache,
+                                          (image_max_size, jpeg_quality, crops, mosaic), journal))
+
+    message_history = []
+    summaries = []
+    for user_message, reply in results:
+        message_history.append(user_message)
+        message_history.append({"role": "assistant", "content": reply})
+        summaries.append(reply)
+
+    return message_history, summaries
@@ -0,0 +1,368 @@
+# batch_runner.py
+# Runs the runThis.py pipeline over many videos at once.
+# 여러 영상을 한 번에 처리하는 배치 실행 스크립트입니다.
+#
+# Frame extraction runs in a process pool (one warm YOLO model per worker process).
+# As soon as a video's frames are ready it is queued for the GPT stage, which runs in
+# a thread pool in this process and shares one rate limiter and one response cache,
+# so the account limits hold across all videos. Every video gets its own journal and
+# log in ./log; job status is kept in log/batch_status.json so finished videos are
+# skipped when the batch is run again.
+#
+# Usage:
+#   python batch_runner.py ./vid --config batch_config.json
+#   python batch_runner.py videos.txt --config batch_config.json --workers 4 --gpt-workers 2
+#   python batch_runner.py ./vid --config batch_config.json --rerun   # ignore finished status
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+STATUS_PATH = os.path.join("log", "batch_status.json")
+
+# Same settings (and defaults) as the top of runThis.py; a config file overrides any of them
+DEFAULT_CONFIG = {
+    "interval_seconds": 1,
+    "set_detection": True,
+    "set_segmentation": True,
+    "class_id": None,
+    "export_detections": False,
+    "sampling": "auto",
+    "batch_size": 8,
+    "imgsz": 640,
+    "yolo_backend": "torch",
+    "yolo_int8": False,
+    "track_objects": False,
+    "tracker": "bytetrack.yaml",
+    "track_format": "text",
+    "send_on_change": True,
+    "track_images": True,
+    "group_size": 5,
+    "image_max_size": 800,
+    "jpeg_quality": 85,
+    "dedup_method": None,
+    "dedup_threshold": None,
+    "payload_mode": "full",
+    "roi_padding": 0.15,
+    "mosaic_tokens": 765,
+    "group_prompt": "You will be shown a sequence of images. These images are consecutive frames extracted from a video, "
+                    "maintaining their original temporal order.",
+    "context_policy": "full",
+    "context_window": 3,
+    "max_concurrency": 4,
+    "use_cache": True,
+    "cache_max_mb": 100,
+    "final_questions": ["Summarize the your findings."],
+    "requests_per_minute": 20,
+    "tokens_per_minute": 200000,
+    "request_timeout": 120,
+    "max_retries": 5,
+}
+
+# Warm model of an extraction worker process, loaded once by _init_worker
+_worker_model = None
+
+
+def load_config(path=None):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown config keys in {path}: {', '.join(sorted(unknown))}")
+        config.update(overrides)
+    return config
+
+
+def config_hash(config):
+    encoded = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def list_videos(source):
+    """Videos of a directory, or the paths listed one per line in a manifest file."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(VIDEO_EXTENSIONS) and not name.endswith("_converted.mp4")
+        )
+    with open(source, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def trial_names(video_path, config):
+    data_name = os.path.splitext(os.path.basename(video_path))[0]
+    trial_name = data_name + "_trial"
+    return data_name, trial_name, f"{trial_name}_{config['interval_seconds']}s"
+
+
+class JobStatus:
+    """Per-video job state persisted to a JSON file after every change."""
+
+    def __init__(self, path=STATUS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.jobs = json.load(f)
+
+    def get(self, video_path):
+        return self.jobs.get(os.path.abspath(video_path), {})
+
+    def update(self, video_path, **fields):
+        with self._lock:
+            job = self.jobs.setdefault(os.path.abspath(video_path), {})
+            job.update(fields, updated=time.time())
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.jobs, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+
+def _init_worker(load_model, weights, backend, imgsz, int8, threads):
+    global _worker_model
+    # Every worker would otherwise use one inference thread per core (N workers x N threads);
+    # the env vars reach the OpenMP / BLAS pools of libraries imported after this point
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    if load_model:
+        import torch
+        torch.set_num_threads(threads)
+        from yolo_backend import load_model as load_yolo
+        _worker_model = load_yolo(weights, backend, imgsz, int8)
+
+
+def _extract_job(video_path, config):
+    # Runs in an extraction worker process
+    from extract_frames import extract_frames
+    data_name, trial_name, _ = trial_names(video_path, config)
+    return extract_frames(video_path, data_name, trial_name, config["interval_seconds"],
+                          config["set_detection"], config["set_segmentation"], config["class_id"],
+                          sampling=config["sampling"], batch_size=config["batch_size"], imgsz=config["imgsz"],
+                          headless=True, export_detections=config["export_detections"], model=_worker_model,
+                          backend=config["yolo_backend"], int8=config["yolo_int8"],
+                          track=config["track_objects"], tracker=config["tracker"])
+
+
+def _conversation_job(video_path, config, rate_limiter, response_cache, resume, extraction_report):
+    # Runs in a GPT thread of the main process; mirrors steps B-D of runThis.py
+    from run_conversation import run_conversation
+    from conversation_with_gpt import ask_followup_question
+    from run_journal import RunJournal
+
+    start_time = time.time()
+    _, trial_name, _ = trial_names(video_path, config)
+    journal_config = {key: config[key] for key in (
+        "interval_seconds", "group_size", "group_prompt", "context_policy", "context_window",
+        "image_max_size", "jpeg_quality", "dedup_method", "dedup_threshold", "payload_mode", "roi_padding", "class_id",
+        "mosaic_tokens", "send_on_change", "track_images")}
+    journal_config["video_name"] = os.path.basename(video_path)
+    track_format = config["track_format"] if config["track_objects"] else None
+    journal_config["track_format"] = track_format
+    journal_path = os.path.join("log", f"{trial_name}_journal.jsonl")
+    journal = RunJournal(journal_path, journal_config, resume=resume)
+
+    usage_log = []
+    dedup_report = {}
+    payload_report = {}
+    tracking_report = {}
+    try:
+        messages, _ = run_conversation(
+            trial_name=trial_name,
+            interval_seconds=config["interval_seconds"],
+            group_size=config["group_size"],
+            prompt=config["group_prompt"],
+            rate_limiter=rate_limiter,
+            context_policy=config["context_policy"],
+            context_window=config["context_window"],
+            usage_log=usage_log,
+            max_concurrency=config["max_concurrency"],
+            response_cache=response_cache,
+            image_max_size=config["image_max_size"],
+            jpeg_quality=config["jpeg_quality"],
+            dedup_method=config["dedup_method"],
+            dedup_threshold=config["dedup_threshold"],
+            dedup_report=dedup_report,
+            journal=journal,
+            payload_mode=config["payload_mode"],
+            roi_padding=config["roi_padding"],
+            roi_class_id=config["class_id"],
+            payload_report=payload_report,
+            mosaic_tokens=config["mosaic_tokens"],
+            track_format=track_format,
+            send_on_change=config["send_on_change"],
+            track_images=config["track_images"],
+            tracking_report=tracking_report
+        )
+        answers = ask_followup_question(messages, config["final_questions"], rate_limiter=rate_limiter,
+                                        context_policy=config["context_policy"], context_window=config["context_window"],
+                                        usage_log=usage_log, response_cache=response_cache, journal=journal)
+    finally:
+        journal.close()
+
+    log_data = {
+        "video_name": os.path.basename(video_path),
+        "config": config,
+        "final_questions": [q for q, _ in answers],
+        "responses": [a for _, a in answers],
+        "requests": usage_log,
+        "total_payload_bytes": sum(r["payload_bytes"] for r in usage_log),
+        "total_prompt_tokens": sum(r["prompt_tokens"] or 0 for r in usage_log),
+        "total_completion_tokens": sum(r["completion_tokens"] or 0 for r in usage_log),
+        "dedup": dedup_report,
+        "payload": payload_report,
+        "tracking": tracking_report,
+        "extraction": extraction_report,
+        "journal": journal_path,
+        "resumed": resume,
+        "execution_time_seconds": round(time.time() - start_time, 2)
+    }
+    os.makedirs("log", exist_ok=True)
+    log_path = os.path.join("log", f"{trial_name}_log.json")
+    count = 1
+    while os.path.exists(log_path):
+        log_path = os.path.join("log", f"{trial_name}_log_{count}.json")
+        count += 1
+    with open(log_path, "w") as f:
+        json.dump(log_data, f, indent=2, ensure_ascii=False)
+    return log_path
+
+
+def run_batch(videos, config, workers=None, gpt_workers=2, rerun=False, weights="yolo11n-seg.pt"):
+    """
+    Extracts and analyzes every video, skipping those already finished with the same config.
+
+    Parameters:
+        - videos: list of video paths
+        - config: settings dict (see DEFAULT_CONFIG)
+        - workers: extraction processes (default: number of CPU cores)
+        - gpt_workers: videos whose GPT conversation runs at the same time
+        - rerun: process finished videos again
+        - weights: YOLO weights loaded once per extraction worker
+
+    Returns:
+        - the JobStatus with the final state of every video
+    """
+    from rate_limit import TokenBucketLimiter
+    from response_cache import ResponseCache
+    from metrics import METRICS
+    from image_prep import set_pool_start_method
+    from request_executor import EXECUTOR
+
+    status = JobStatus()
+    digest = config_hash(config)
+    rate_limiter = TokenBucketLimiter(config["requests_per_minute"], config["tokens_per_minute"])
+    EXECUTOR.timeout = config["request_timeout"]
+    EXECUTOR.max_retries = config["max_retries"]
+    response_cache = ResponseCache(max_bytes=config["cache_max_mb"] * 1024 * 1024, enabled=config["use_cache"])
+
+    pending_extract, pending_gpt = [], []
+    for video in videos:
+        job = status.get(video)
+        same_config = job.get("config_hash") == digest
+        if same_config and job.get("state") == "done" and not rerun:
+            print(f"✅ Skipping finished video: {video}")
+            continue
+        _, _, folder_name = trial_names(video, config)
+        if same_config and job.get("state") in ("extracted", "gpt", "failed_gpt") and os.path.isdir(os.path.join("output", folder_name)):
+            pending_gpt.append(video)
+        else:
+            pending_extract.append(video)
+
+    workers = workers or os.cpu_count() or 1
+    load_model = config["set_detection"] or config["set_segmentation"]
+    print(f"📋 Batch: {len(videos)} videos, {len(pending_extract)} to extract ({workers} workers), "
+          f"{len(pending_extract) + len(pending_gpt)} to analyze ({gpt_workers} at a time)")
+
+    def analyze(video, extraction_report):
+        job = status.get(video)
+        # Continue from the journal when an earlier GPT stage of this video was interrupted
+        resume = job.get("state") in ("gpt", "failed_gpt") and job.get("config_hash") == digest
+        status.update(video, state="gpt", config_hash=digest)
+        try:
+            log_path = _conversation_job(video, config, rate_limiter, response_cache, resume, extraction_report)
+        except Exception as e:
+            print(f"❌ GPT stage failed for {video}: {e}")
+            status.update(video, state="failed_gpt", error=repr(e))
+            return
+        status.update(video, state="done", log=log_path, error=None)
+        print(f"✅ Finished {video} → {log_path}")
+
+    start_time = time.time()
+    # The GPT threads encode images in a process pool; it must not fork this threaded process
+    set_pool_start_method("spawn")
+    gpt_pool = ThreadPoolExecutor(max_workers=gpt_workers, thread_name_prefix="batch-gpt")
+    gpt_futures = [gpt_pool.submit(analyze, video, None) for video in pending_gpt]
+
+    # spawn: the GPT threads are already running, and forking a threaded process is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    if load_model and pending_extract and config["yolo_backend"] != "torch":
+        # Export once here, so the workers only load the cached model instead of racing to export it
+        from yolo_backend import export_model
+        export_model(weights, config["yolo_backend"], config["imgsz"], config["yolo_int8"])
+    # Split the cores between the workers instead of letting each one use all of them
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    worker_args = (load_model, weights, config["yolo_backend"], config["imgsz"], config["yolo_int8"], threads)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=worker_args) as extract_pool:
+        futures = {}
+        for video in pending_extract:
+            status.update(video, state="extracting", config_hash=digest)
+            futures[extract_pool.submit(_extract_job, video, config)] = video
+
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                report = future.result()
+            except BaseException as e:  # extract_frames exits on unreadable videos
+                print(f"❌ Extraction failed for {video}: {e!r}")
+                status.update(video, state="failed_extract", error=repr(e))
+                continue
+            status.update(video, state="extracted", error=None)
+            gpt_futures.append(gpt_pool.submit(analyze, video, report))
+
+    for future in gpt_futures:
+        future.result()
+    gpt_pool.shutdown()
+    response_cache.close()
+
+    summary = {
+        "videos": len(videos),
+        "states": {state: sum(1 for v in videos if status.get(v).get("state") == state)
+                   for state in sorted({status.get(v).get("state") for v in videos} - {None})},
+        "rate_limit_wait_seconds": round(rate_limiter.total_wait_seconds, 2),
+        "request_retries": EXECUTOR.stats(),
+        "cache": response_cache.stats(),
+        "stage_metrics": METRICS.as_dict(),
+        "execution_time_seconds": round(time.time() - start_time, 2),
+    }
+    summary_path = os.path.join("log", f"batch_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"\n📊 Batch done in {summary['execution_time_seconds']}s: {summary['states']} (summary: {summary_path})")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run frame extraction + GPT analysis over many videos.")
+    parser.add_argument("source", help="Directory of videos, or a manifest file with one video path per line")
+    parser.add_argument("--config", help="JSON file overriding the settings in DEFAULT_CONFIG")
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: number of CPU cores)")
+    parser.add_argument("--gpt-workers", type=int, default=2, help="Videos analyzed by GPT at the same time")
+    parser.add_argument("--weights", default="yolo11n-seg.pt", help="YOLO weights loaded once per worker")
+    parser.add_argument("--rerun", action="store_true", help="Process videos again even if they are finished")
+    args = parser.parse_args()
+
+    run_batch(list_videos(args.source), load_config(args.config), workers=args.workers,
+              gpt_workers=args.gpt_workers, rerun=args.rerun, weights=args.weights)
@@ -0,0 +1,121 @@
+# benchmark_inference.py
+# Measures YOLO throughput (inference + overlay post-processing) for different
+# batch sizes and inference backends on frames sampled from one video.
+#
+# For every backend it reports:
+#   - cold start: a fresh process importing ultralytics, loading the (cached) model and
+#     answering its first frame, i.e. what an extraction worker pays before its first batch
+#   - per-frame latency at batch size 1, and frames/s for each batch size
+# The export itself (first run only) is timed separately and not part of the cold start.
+#
+# Usage:
+#   python benchmark_inference.py ./vid/my_video.mp4 1
+#   python benchmark_inference.py ./vid/my_video.mp4 1 --batch-sizes 1 4 16 --imgsz 480
+#   python benchmark_inference.py ./vid/my_video.mp4 1 --backends torch onnx openvino --int8
+
+import argparse
+import multiprocessing
+import time
+import cv2
+from frame_sampler import sample_frames
+from extract_frames import apply_detections, infer_batch
+from yolo_backend import load_model, export_model, BACKENDS
+
+
+def load_sampled_frames(video_path, interval_sec, max_frames):
+    vidcap = cv2.VideoCapture(video_path)
+    width = int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = vidcap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_interval = int(fps * interval_sec)
+
+    images = []
+    for _, image in sample_frames(vidcap, video_path, total_frames, frame_interval, width, height):
+        images.append(image)
+        if len(images) >= max_frames:
+            break
+    vidcap.release()
+    return images, width, height
+
+
+def benchmark_batch_size(model, images, width, height, batch_size, imgsz):
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        results = infer_batch(model, batch, imgsz=imgsz)
+        for image, result in zip(batch, results):
+            apply_detections(image, result, model.names, width, height, detection=True, segmentation=True)
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed if elapsed > 0 else 0.0
+
+
+def _cold_start(weights, backend, imgsz, int8, image, result_queue):
+    # Runs in a fresh process, so the ultralytics/torch import is part of the measurement
+    start = time.perf_counter()
+    from yolo_backend import load_model
+    from extract_frames import infer_batch
+    model = load_model(weights, backend, imgsz, int8)
+    loaded = time.perf_counter()
+    infer_batch(model, [image], imgsz=imgsz)
+    result_queue.put({"load_seconds": loaded - start, "first_frame_seconds": time.perf_counter() - start})
+
+
+def measure_cold_start(weights, backend, imgsz, int8, image):
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    proc = ctx.Process(target=_cold_start, args=(weights, backend, imgsz, int8, image, result_queue))
+    proc.start()
+    result = result_queue.get()
+    proc.join()
+    return result
+
+
+def benchmark_backend(weights, backend, images, width, height, batch_sizes, imgsz, int8):
+    if backend != "torch":
+        start = time.perf_counter()
+        export_model(weights, backend, imgsz, int8)
+        export_seconds = time.perf_counter() - start
+    else:
+        export_seconds = 0.0
+
+    cold = measure_cold_start(weights, backend, imgsz, int8, images[0])
+    model = load_model(weights, backend, imgsz, int8)
+    # Warm-up so the first batch size does not pay for model initialisation
+    infer_batch(model, images[:1], imgsz=imgsz)
+
+    start = time.perf_counter()
+    for image in images:
+        infer_batch(model, [image], imgsz=imgsz)
+    latency_ms = (time.perf_counter() - start) / len(images) * 1000
+
+    return {
+        "backend": backend + ("+int8" if int8 and backend != "torch" else ""),
+        "export_seconds": export_seconds,
+        "cold_start_seconds": cold["first_frame_seconds"],
+        "latency_ms": latency_ms,
+        "frames_per_second": {b: benchmark_batch_size(model, images, width, height, b, imgsz) for b in batch_sizes},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched YOLO inference per backend.")
+    parser.add_argument("video_path", help="Path to input video file")
+    parser.add_argument("interval_sec", type=float, help="Interval in seconds between frames")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Batch sizes to compare")
+    parser.add_argument("--imgsz", type=int, default=640, help="YOLO input resolution")
+    parser.add_argument("--max-frames", type=int, default=64, help="Number of sampled frames to run through the model")
+    parser.add_argument("--weights", default="yolo11n-seg.pt", help="YOLO weights")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["torch"], help="Inference backends to compare")
+    parser.add_argument("--int8", action="store_true", help="Use int8-quantized exports for onnx / openvino")
+    args = parser.parse_args()
+
+    images, width, height = load_sampled_frames(args.video_path, args.interval_sec, args.max_frames)
+    results = [benchmark_backend(args.weights, backend, images, width, height, args.batch_sizes, args.imgsz, args.int8)
+               for backend in args.backends]
+
+    print(f"\n{len(images)} frames at imgsz={args.imgsz}")
+    print(f"{'backend':<15}{'export s':>9}{'cold s':>8}{'ms/frame':>10}" + "".join(f"{'b' + str(b) + ' f/s':>10}" for b in args.batch_sizes))
+    for r in results:
+        print(f"{r['backend']:<15}{r['export_seconds']:>9.1f}{r['cold_start_seconds']:>8.2f}{r['latency_ms']:>10.1f}"
+              + "".join(f"{r['frames_per_second'][b]:>10.1f}" for b in args.batch_sizes))
@@ -0,0 +1,206 @@
+# benchmark_pipeline.py
+# End-to-end benchmark of extraction + GPT conversation against the local mock
+# server (no API cost). Each configuration runs in its own process so peak RSS
+# is measured per configuration.
+#
+# Reports wall time, extraction frames/s, requests/s, bytes uploaded and peak
+# RSS, and saves the results as JSON under benchmark_results/ so they can be
+# compared with an earlier run (--compare).
+#
+# Usage:
+#   python benchmark_pipeline.py
+#   python benchmark_pipeline.py --group-sizes 3 5 --intervals 1 2 --detection off on
+#   python benchmark_pipeline.py --group-sizes 9 --payload-modes full mosaic --latency-per-image 0.05
+#   python benchmark_pipeline.py --handoff disk direct
+#   python benchmark_pipeline.py --compare benchmark_results/pipeline_20250101_120000.json
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+import cv2
+import numpy as np
+from mock_openai_server import start_mock_server
+
+RESULTS_DIR = "benchmark_results"
+
+
+def make_synthetic_video(path, seconds=30, fps=30, size=(640, 360)):
+    """Writes a video of moving rectangles on a noisy background."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 80, (height, width, 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        frame = background.copy()
+        for k in range(4):
+            x = int((i * (2 + k) + k * 150) % (width - 40))
+            y = int(height / 5 * (k + 1)) - 20
+            cv2.rectangle(frame, (x, y), (x + 40, y + 60), (60 * k, 200, 255 - 60 * k), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def config_key(config):
+    key = f"g{config['group_size']}_i{config['interval']}_{'det' if config['detection'] else 'nodet'}"
+    payload_mode = config.get("payload_mode", "full")
+    if payload_mode != "full":
+        key = f"{key}_{payload_mode}"
+    return key if config.get("handoff", "disk") == "disk" else f"{key}_{config['handoff']}"
+
+
+def _run_config(config, video_path, base_url, context_policy, result_queue):
+    # Runs in a fresh process: point the OpenAI client at the mock before anything imports it
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    import resource
+    import openai
+    from extract_frames import extract_frames
+    from run_conversation import run_conversation
+    from direct_conversation import run_direct_conversation
+    from rate_limit import TokenBucketLimiter
+    from request_executor import EXECUTOR
+
+    openai.api_key = os.environ["OPENAI_API_KEY"]
+
+    trial_name = f"bench_{config_key(config)}"
+    payload_mode = config.get("payload_mode", "full")
+    shutil.rmtree(os.path.join("output", f"{trial_name}_{config['interval']}s"), ignore_errors=True)
+
+    usage_log = []
+    limiter = TokenBucketLimiter(requests_per_minute=60000)
+    if config.get("handoff", "disk") == "direct":
+        # Extraction and conversation overlap, so only the total wall time is additive
+        start = time.perf_counter()
+        _, _, report = run_direct_conversation(video_path, "bench", trial_name, config["interval"], config["group_size"],
+                                               "Describe what happens.", rate_limiter=limiter,
+                                               context_policy=context_policy, usage_log=usage_log, save_frames=False,
+                                               extract_options={"detection": config["detection"],
+                                                                "segmentation": config["detection"]})
+        wall_seconds = time.perf_counter() - start
+        extract_seconds = report["wall_seconds"]
+        conversation_seconds = wall_seconds
+    else:
+        start = time.perf_counter()
+        report = extract_frames(video_path, "bench", trial_name, config["interval"],
+                                detection=config["detection"], segmentation=config["detection"], headless=True,
+                                export_detections=payload_mode.startswith("roi"))
+        extract_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_conversation(trial_name, config["interval"], config["group_size"], "Describe what happens.",
+                         rate_limiter=limiter, context_policy=context_policy,
+                         usage_log=usage_log, payload_mode=payload_mode)
+        conversation_seconds = time.perf_counter() - start
+        wall_seconds = extract_seconds + conversation_seconds
+    frames = report["stages"]["write"]["items"]
+    groups = [r for r in usage_log if r["request"].startswith("group")]
+
+    result_queue.put({
+        "key": config_key(config),
+        "config": config,
+        "context_policy": context_policy,
+        "frames": frames,
+        "extract_seconds": round(extract_seconds, 3),
+        "extract_frames_per_second": round(frames / extract_seconds, 2) if extract_seconds > 0 else None,
+        "requests": len(usage_log),
+        "conversation_seconds": round(conversation_seconds, 3),
+        "requests_per_second": round(len(usage_log) / conversation_seconds, 2) if conversation_seconds > 0 else None,
+        "bytes_uploaded": sum(r["payload_bytes"] for r in usage_log),
+        "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in usage_log),
+        "group_requests": len(groups),
+        "prompt_tokens_per_group": round(sum(r["prompt_tokens"] or 0 for r in groups) / len(groups)) if groups else None,
+        "latency_per_group": round(sum(r["latency_seconds"] for r in groups) / len(groups), 3) if groups else None,
+        "wall_seconds": round(wall_seconds, 3),
+        "retry_sleep_seconds": EXECUTOR.stats()["total_sleep_seconds"],
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+def run_benchmark(configs, video_path, context_policy="full", latency=0.2, rate_limit_every=0, latency_per_image=0.0):
+    server = start_mock_server(latency=latency, latency_per_image=latency_per_image, rate_limit_every=rate_limit_every)
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for config in configs:
+            print(f"\n🏁 Benchmarking {config_key(config)}...")
+            before = server.stats.as_dict()
+            result_queue = ctx.Queue()
+            proc = ctx.Process(target=_run_config, args=(config, video_path, server.base_url, context_policy, result_queue))
+            proc.start()
+            result = None
+            while result is None:
+                try:
+                    result = result_queue.get(timeout=1)
+                except queue.Empty:
+                    if not proc.is_alive():
+                        raise RuntimeError(f"Benchmark process for {config_key(config)} exited with code {proc.exitcode}")
+            proc.join()
+            after = server.stats.as_dict()
+            result["mock_rate_limited"] = after["rate_limited"] - before["rate_limited"]
+            results.append(result)
+    finally:
+        server.shutdown()
+    return results
+
+
+def print_results(results, previous=None):
+    previous = {r["key"]: r for r in (previous or [])}
+    print(f"\n{'config':<24}{'wall s':>9}{'frames/s':>10}{'req/s':>8}{'MB up':>9}{'tok/grp':>9}{'s/grp':>7}"
+          f"{'RSS MB':>8}{'vs prev':>9}")
+    for r in results:
+        delta = ""
+        if r["key"] in previous and previous[r["key"]]["wall_seconds"]:
+            change = (r["wall_seconds"] / previous[r["key"]]["wall_seconds"] - 1) * 100
+            delta = f"{change:+.0f}%"
+        print(f"{r['key']:<24}{r['wall_seconds']:>9.2f}{r['extract_frames_per_second'] or 0:>10.1f}"
+              f"{r['requests_per_second'] or 0:>8.2f}{r['bytes_uploaded'] / 1e6:>9.2f}"
+              f"{r.get('prompt_tokens_per_group') or 0:>9}{r.get('latency_per_group') or 0:>7.2f}"
+              f"{r['peak_rss_mb']:>8.1f}{delta:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against a local mock OpenAI server.")
+    parser.add_argument("--video", help="Video to use (default: generate a synthetic one)")
+    parser.add_argument("--seconds", type=int, default=30, help="Length of the synthetic video")
+    parser.add_argument("--group-sizes", type=int, nargs="+", default=[5])
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1])
+    parser.add_argument("--detection", choices=["off", "on"], nargs="+", default=["off"])
+    parser.add_argument("--payload-modes", nargs="+", default=["full"],
+                        help="Payload modes to compare: full, roi, roi_tiles, mosaic (ROI modes need --detection on)")
+    parser.add_argument("--handoff", choices=["disk", "direct"], nargs="+", default=["disk"],
+                        help="disk: extract to output/, then read back; direct: in-memory handoff (full payload only)")
+    parser.add_argument("--context-policy", default="full")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock response latency in seconds")
+    parser.add_argument("--latency-per-image", type=float, default=0.0, help="Extra mock latency per image")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Mock returns 429 on every N-th request")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    video_path = args.video or make_synthetic_video(os.path.join(RESULTS_DIR, "synthetic.mp4"), seconds=args.seconds)
+
+    configs = [
+        {"group_size": g, "interval": i, "detection": d == "on", "payload_mode": m, "handoff": h}
+        for g, i, d, m, h in itertools.product(args.group_sizes, args.intervals, args.detection, args.payload_modes, args.handoff)
+        if h == "disk" or m == "full"
+    ]
+    results = run_benchmark(configs, video_path, args.context_policy, args.latency, args.rate_limit_every,
+                            args.latency_per_image)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+    print_results(results, previous)
+
+    out_path = os.path.join(RESULTS_DIR, f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump({"timestamp": time.time(), "video": video_path, "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to {out_path}")
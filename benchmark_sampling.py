@@ -0,0 +1,55 @@
+# benchmark_sampling.py
+# Compares the frame sampling strategies of frame_sampler on one video.
+# Reports sampled frames per second for each strategy and checks that every
+# strategy produces the same frame ids (and therefore the same filenames).
+#
+# Usage:
+#   python benchmark_sampling.py ./vid/my_video.mp4 1
+#   python benchmark_sampling.py ./vid/my_video.mp4 10 --strategies sequential seek
+
+import argparse
+import time
+import cv2
+from frame_sampler import sample_frames
+
+
+def benchmark_strategy(video_path, interval_sec, strategy):
+    vidcap = cv2.VideoCapture(video_path)
+    width = int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = vidcap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_interval = int(fps * interval_sec)
+
+    start = time.perf_counter()
+    frame_ids = [frame_id for frame_id, _ in sample_frames(vidcap, video_path, total_frames, frame_interval, width, height, strategy=strategy)]
+    elapsed = time.perf_counter() - start
+    vidcap.release()
+
+    timestamps = [int(frame_id / fps) for frame_id in frame_ids]
+    return {
+        "strategy": strategy,
+        "frames": len(frame_ids),
+        "seconds": elapsed,
+        "fps": len(frame_ids) / elapsed if elapsed > 0 else 0.0,
+        "timestamps": timestamps,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark frame sampling strategies.")
+    parser.add_argument("video_path", help="Path to input video file")
+    parser.add_argument("interval_sec", type=float, help="Interval in seconds between frames")
+    parser.add_argument("--strategies", nargs="+", default=["sequential", "seek", "ffmpeg"], help="Strategies to compare")
+    args = parser.parse_args()
+
+    results = [benchmark_strategy(args.video_path, args.interval_sec, s) for s in args.strategies]
+
+    print(f"\n{'strategy':<12}{'frames':>8}{'seconds':>10}{'frames/s':>10}")
+    for r in results:
+        print(f"{r['strategy']:<12}{r['frames']:>8}{r['seconds']:>10.2f}{r['fps']:>10.1f}")
+
+    reference = results[0]["timestamps"]
+    for r in results[1:]:
+        if r["timestamps"] != reference:
+            print(f"⚠️ {r['strategy']} produced different timestamps than {results[0]['strategy']}")
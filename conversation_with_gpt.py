@@ -1,60 +1,38 @@
 import os
+import json
 import openai
-import base64
 import time
 from dotenv import load_dotenv
-from PIL import Image
-import io
+from image_prep import get_base64, prepare_images
+from frame_dedup import select_keyframes, DEFAULT_THRESHOLDS
+from roi_crop import compute_crops, describe_crop, payload_report as roi_payload_report
+from mosaic import mosaic_base64, describe_mosaic, payload_report as mosaic_payload_report, MOSAIC_TOKEN_BUDGET, check_token_budget
+from scene_tracker import plan_tracked_groups
+from metrics import METRICS, timed, profiled
+from request_executor import EXECUTOR
 
 # Load OpenAI API key from .env
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-class RequestManager:
-    def __init__(self, requests_before_pause=3, pause_duration=30):
-        self.request_count = 0
-        self.requests_before_pause = requests_before_pause
-        self.pause_duration = pause_duration
-        self.last_pause_time = time.time()
-
-    def check_and_wait(self):
-        self.request_count += 1
-        current_time = time.time()
-
-        if self.request_count >= self.requests_before_pause:
-            time_since_last_pause = current_time - self.last_pause_time
-            if time_since_last_pause < self.pause_duration:
-                wait_time = self.pause_duration - time_since_last_pause
-                print(f"\n💤 Pausing for {int(wait_time)} seconds to manage rate limits... ({self.request_count} requests processed)")
-                time.sleep(wait_time)
-
-            self.request_count = 0
-            self.last_pause_time = time.time()
-            print("▶️ Resuming requests...\n")
-
-def resize_image(image_path, max_size=800):
-    """Resize image to reduce token usage while maintaining quality"""
-    with Image.open(image_path) as img:
-        # Calculate new size maintaining aspect ratio
-        ratio = min(max_size / max(img.size[0], img.size[1]), 1.0)
-        new_size = tuple(int(dim * ratio) for dim in img.size)
-
-        if ratio < 1.0:  # Only resize if image is larger than max_size
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-
-        # Save to bytes
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=85, optimize=True)
-        return buffer.getvalue()
-
-def _to_base64(file_path: str) -> str:
-    # Use resize_image instead of reading directly
-    image_data = resize_image(file_path)
-    return base64.b64encode(image_data).decode("utf-8")
-
-def start_conversation_with_images(folder_name: str, group_size: int, prompt: str, rate_limiter=None, model: str = "gpt-4.1-mini"):
+def _to_base64(file_path: str, max_size: int = 800, quality: int = 85, crop=None) -> str:
+    # Prepared ahead of time by prepare_images; falls back to encoding on the spot
+    return get_base64(file_path, max_size, quality, crop=crop)
+
+CONTEXT_POLICIES = ("full", "window", "text", "none")
+
+# Rough prompt-token cost of one 800 px image at high detail (base 85 + 4 tiles of 170)
+IMAGE_TOKEN_ESTIMATE = 765
+
+
+def list_image_groups(folder_name: str, group_size: int, dedup_method: str = None, dedup_threshold=None,
+                      dedup_report=None, prompt: str = ""):
     """
-    Sends grouped images with prompt to GPT and accumulates responses.
+    Returns the sorted frame paths of output/<folder_name>, split into groups of group_size.
+
+    With dedup_method ("dhash" or "histogram"), near-duplicate frames are dropped
+    before grouping (see frame_dedup.select_keyframes). If dedup_report is a dict it
+    receives the number of skipped frames/groups and the estimated tokens saved.
     """
     folder_path = os.path.join("output", folder_name)
     image_paths = sorted([
@@ -65,102 +43,405 @@ def start_conversation_with_images(folder_name: str, group_size: int, prompt: st
     if not image_paths:
         raise ValueError(f"No image files found in folder: {folder_path}")
 
-    grouped = [image_paths[i:i + group_size] for i in range(0, len(image_paths), group_size)]
+    n_groups_before = -(-len(image_paths) // group_size)
+    kept_paths = image_paths
+    if dedup_method is not None:
+        if dedup_threshold is None:
+            dedup_threshold = DEFAULT_THRESHOLDS.get(dedup_method)
+        kept_paths = select_keyframes(image_paths, dedup_method, dedup_threshold)
+
+    grouped = [kept_paths[i:i + group_size] for i in range(0, len(kept_paths), group_size)]
+
+    if dedup_method is not None:
+        skipped_frames = len(image_paths) - len(kept_paths)
+        skipped_groups = n_groups_before - len(grouped)
+        tokens_saved = skipped_frames * IMAGE_TOKEN_ESTIMATE + skipped_groups * (len(prompt) // 4)
+        print(f"🧹 Dedup ({dedup_method}): kept {len(kept_paths)}/{len(image_paths)} frames, "
+              f"{skipped_groups} fewer groups, ~{tokens_saved} tokens saved")
+        if dedup_report is not None:
+            dedup_report.update({
+                "method": dedup_method,
+                "threshold": dedup_threshold,
+                "frames_total": len(image_paths),
+                "frames_skipped": skipped_frames,
+                "groups_skipped": skipped_groups,
+                "estimated_tokens_saved": tokens_saved,
+            })
+
+    return grouped
+
+
+def apply_tracking(folder_name: str, grouped, prompt: str, track_format: str = None, send_on_change: bool = True,
+                   track_images: bool = True, tracking_report=None):
+    """
+    Adds the tracking summary of each group to its prompt and drops groups whose scene did not change.
+
+    Needs tracks.json from extract_frames(track=True); track_format is "text" or "json"
+    (None = tracking off). See scene_tracker.plan_tracked_groups for what is sent when.
+    With track_images=False, only the tracking summaries are sent (no images at all).
+    If tracking_report is a dict it receives the group/request counts.
+
+    Returns:
+        - grouped: the groups to send, in order (empty for text-only updates)
+        - prompts: the prompt of each group
+    """
+    prompts = [prompt] * len(grouped)
+    if track_format is None:
+        return grouped, prompts
+    plan = plan_tracked_groups(os.path.join("output", folder_name), grouped, track_format, send_on_change, tracking_report)
+    if plan is None:
+        return grouped, prompts
+
+    grouped, prompts = [], []
+    for group, stats, changed in plan:
+        if not track_images:
+            grouped.append([])
+            prompts.append(f"{prompt}\nNo images are attached; use the tracking data of the detected objects.\n\n{stats}")
+        elif not changed:
+            grouped.append([])
+            prompts.append(f"The scene composition has not changed since the last images. Tracking update:\n\n{stats}")
+        else:
+            grouped.append(group)
+            prompts.append(f"{prompt}\n\n{stats}")
+    return grouped, prompts
+
+
+def prepare_group_images(folder_name: str, grouped, max_size: int = 800, quality: int = 85, payload_mode: str = "full",
+                         roi_padding: float = 0.15, roi_class_id=None, payload_report=None,
+                         mosaic_tokens: int = MOSAIC_TOKEN_BUDGET):
+    """
+    Encodes every frame of the run ahead of time and returns the crops to send.
+
+    With payload_mode "roi" or "roi_tiles", frames are cropped to their detections
+    (see roi_crop.compute_crops); frames without detections are sent whole. With
+    "mosaic", each group is sent as one grid image costing about mosaic_tokens (see
+    mosaic.plan_mosaic). If payload_report is a dict it receives image bytes/tokens
+    per group before and after.
+
+    Returns:
+        - dict frame path -> crop (empty for payload_mode "full" and "mosaic")
+    """
+    crops = {}
+    grouped = [group for group in grouped if group]  # text-only tracking updates carry no images
+    if payload_mode == "mosaic":
+        check_token_budget(mosaic_tokens)  # fail before the first request, not in the middle of the run
+        if payload_report is not None:
+            # Separate frames are only encoded to have the "before" numbers
+            prepare_images([p for group in grouped for p in group], max_size, quality)
+            payload_report.update(mosaic_payload_report(grouped, max_size, quality, mosaic_tokens), mode=payload_mode)
+        return crops
+
+    if payload_mode != "full":
+        crops = compute_crops(os.path.join("output", folder_name), payload_mode, roi_class_id, roi_padding)
+    prepare_images([p for group in grouped for p in group], max_size, quality,
+                   crops={path: crop["boxes"] for path, crop in crops.items()})
+    if payload_mode != "full" and payload_report is not None:
+        # The "before" numbers need the cropped frames whole as well; encode them in the pool too
+        prepare_images(list(crops), max_size, quality)
+        payload_report.update(roi_payload_report(grouped, crops, max_size, quality), mode=payload_mode)
+    return crops
+
+
+def build_group_message(group, prompt: str, max_size: int = 800, quality: int = 85, crops=None, mosaic_tokens=None):
+    """
+    Builds the user message for one image group: the prompt followed by the base64 images.
+
+    With crops (see prepare_group_images), each image is preceded by a line giving
+    its crop coordinates in the original frame. With mosaic_tokens, the group is
+    sent as a single labelled grid image of about that many tokens.
+    """
+    content = [{"type": "text", "text": prompt}]
+    if mosaic_tokens and group:
+        encoded, plan = mosaic_base64(group, mosaic_tokens, quality)
+        content.append({"type": "text", "text": describe_mosaic(len(group), plan)})
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}})
+        return {"role": "user", "content": content}
+
+    for i, p in enumerate(group):
+        crop = crops.get(p) if crops is not None else None
+        if crops is not None:
+            content.append({"type": "text", "text": describe_crop(i + 1, crop)})
+        url = f"data:image/jpeg;base64,{_to_base64(p, max_size, quality, crop['boxes'] if crop else None)}"
+        content.append({"type": "image_url", "image_url": {"url": url}})
+    return {"role": "user", "content": content}
+
+
+def build_encoded_group_message(encoded_images, prompt: str):
+    """Builds the user message for one group of frames that are already base64 JPEGs (in-memory handoff)."""
+    content = [{"type": "text", "text": prompt}]
+    content += [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{e}"}} for e in encoded_images]
+    return {"role": "user", "content": content}
+
+
+def estimate_request_tokens(messages, max_tokens=1000):
+    """Estimates the tokens a request will consume (prompt text, images and the completion budget)."""
+    tokens = max_tokens
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKEN_ESTIMATE
+            else:
+                tokens += len(part.get("text", "")) // 4
+    return tokens
+
+
+def _is_image_turn(message):
+    # Group turns carry a list of content parts; follow-up questions are plain strings
+    return message["role"] == "user" and isinstance(message["content"], list)
+
+
+def _strip_images(message):
+    parts = message["content"]
+    n_images = sum(1 for part in parts if part.get("type") == "image_url")
+    if n_images == 0:
+        return message
+    text = [part for part in parts if part.get("type") != "image_url"][:1]
+    stub = {"type": "text", "text": f"[{n_images} images from this group omitted]"}
+    return {"role": "user", "content": text + [stub]}
+
 
+def compact_history(message_history, context_policy="full", context_window=3):
+    """
+    Drops the base64 images of image turns that no future request will send.
+
+    "full" keeps everything, "window" keeps the images of the last context_window
+    groups, "text" keeps only the most recent group's images and "none" keeps none. Assistant replies
+    are always kept, so earlier groups stay available as text memory.
+    """
+    if context_policy == "full":
+        return message_history
+    keep = context_window if context_policy == "window" else 1
+    if context_policy == "none":
+        keep = 0
+
+    image_turns = [i for i, m in enumerate(message_history) if _is_image_turn(m)]
+    for i in image_turns[:max(len(image_turns) - keep, 0)]:
+        message_history[i] = _strip_images(message_history[i])
+    return message_history
+
+
+def build_request_messages(message_history, context_policy="full", context_window=3):
+    """
+    Returns the messages actually sent for the next request under the given policy.
+
+    - full: the whole history (every image ever sent)
+    - window: only the last context_window image groups (and their replies), plus follow-ups
+    - text: every group, but earlier groups are reduced to the assistant's replies
+    - none: each group is sent on its own (groups are independent and can run concurrently);
+      follow-up questions fall back to the "text" view of the history
+    """
+    if context_policy not in CONTEXT_POLICIES:
+        raise ValueError(f"Unknown context policy: {context_policy} (choose from {', '.join(CONTEXT_POLICIES)})")
+    if context_policy == "none":
+        if message_history and _is_image_turn(message_history[-1]):
+            return [message_history[-1]]
+        context_policy = "text"
+    if context_policy != "window":
+        return compact_history(list(message_history), context_policy, context_window)
+
+    image_turns = [i for i, m in enumerate(message_history) if _is_image_turn(m)]
+    dropped = set(image_turns[:max(len(image_turns) - context_window, 0)])
+    messages = []
+    skip_reply = False
+    for i, message in enumerate(message_history):
+        if i in dropped:
+            skip_reply = True
+            continue
+        if skip_reply and message["role"] == "assistant":
+            skip_reply = False
+            continue
+        skip_reply = False
+        messages.append(message)
+    return messages
+
+
+def _used_tokens(response):
+    # Prompt plus completion, since the estimate includes the completion budget too
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+
+def _record_request(usage_log, label, messages, response, elapsed, cached=False):
+    # Cache hits send nothing; their token counts are those of the original request
+    payload_bytes = 0 if cached else len(json.dumps(messages))
+    usage = getattr(response, "usage", None)
+    entry = {
+        "request": label,
+        "payload_bytes": payload_bytes,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "latency_seconds": round(elapsed, 3),
+        "cached": cached,
+    }
+    if cached:
+        print("   🗄️ Cache hit, nothing sent")
+    else:
+        print(f"   📦 {payload_bytes / 1024:.1f} KB sent, {entry['prompt_tokens']} prompt / {entry['completion_tokens']} completion tokens")
+    if usage_log is not None:
+        usage_log.append(entry)
+    return entry
+
+
+def _send_request(request_messages, model, label, rate_limiter=None, response_cache=None, usage_log=None):
+    """
+    Sends one chat completion (or answers it from response_cache) and records its usage.
+
+    Retries, timeouts and pacing on the API's rate-limit headers are handled by EXECUTOR.
+    Returns the reply text and the usage entry recorded for it.
+    """
+    if response_cache is not None:
+        start = time.time()
+        with timed("gpt.cache_lookup"):
+            cached = response_cache.get(model, request_messages, 0.3, 1000)
+        if cached is not None:
+            entry = _record_request(usage_log, label, request_messages, cached, time.time() - start, cached=True)
+            return cached.choices[0].message.content, entry
+
+    estimated_tokens = estimate_request_tokens(request_messages)
+    if rate_limiter is not None:
+        with timed("gpt.rate_limit_wait"):
+            rate_limiter.wait(estimated_tokens)
+
+    start = time.time()
+    response = EXECUTOR.create(
+        label=label,
+        estimated_tokens=estimated_tokens,
+        model=model,
+        messages=request_messages,
+        temperature=0.3,
+        max_tokens=1000
+    )
+    entry = _record_request(usage_log, label, request_messages, response, time.time() - start)
+    METRICS.add("gpt.request", entry["latency_seconds"])
+    if rate_limiter is not None:
+        rate_limiter.settle(estimated_tokens, _used_tokens(response))
+    if response_cache is not None:
+        response_cache.put(model, request_messages, 0.3, 1000, response)
+    return response.choices[0].message.content, entry
+
+
+def start_conversation_with_images(folder_name: str, group_size: int, prompt: str, rate_limiter=None, model: str = "gpt-4.1-mini",
+                                   context_policy: str = "full", context_window: int = 3, usage_log=None, response_cache=None,
+                                   image_max_size: int = 800, jpeg_quality: int = 85,
+                                   dedup_method: str = None, dedup_threshold=None, dedup_report=None, journal=None,
+                                   payload_mode: str = "full", roi_padding: float = 0.15, roi_class_id=None,
+                                   payload_report=None, mosaic_tokens: int = MOSAIC_TOKEN_BUDGET,
+                                   track_format: str = None, send_on_change: bool = True, track_images: bool = True,
+                                   tracking_report=None):
+    """
+    Sends grouped images with prompt to GPT and accumulates responses.
+
+    context_policy controls how much of the history is re-sent with each group
+    (see build_request_messages). Per-request payload bytes and token usage are
+    printed and, if usage_log is a list, appended to it. Requests already answered
+    in response_cache (a ResponseCache) are not sent again. All frames are resized
+    to image_max_size and JPEG-encoded at jpeg_quality before the first request.
+    dedup_method / dedup_threshold / dedup_report: see list_image_groups. With a
+    RunJournal, every reply is journaled as it arrives and already journaled groups
+    are restored instead of being sent again. payload_mode / roi_padding / roi_class_id /
+    payload_report / mosaic_tokens: see prepare_group_images. track_format / send_on_change /
+    track_images / tracking_report: see apply_tracking.
+    """
+    grouped = list_image_groups(folder_name, group_size, dedup_method, dedup_threshold, dedup_report, prompt)
+    grouped, prompts = apply_tracking(folder_name, grouped, prompt, track_format, send_on_change, track_images,
+                                      tracking_report)
+    crops = prepare_group_images(folder_name, grouped, image_max_size, jpeg_quality, payload_mode, roi_padding,
+                                 roi_class_id, payload_report, mosaic_tokens)
+    mosaic = mosaic_tokens if payload_mode == "mosaic" else None
+
+    group_messages = (build_group_message(group, group_prompt, image_max_size, jpeg_quality, crops, mosaic)
+                      for group, group_prompt in zip(grouped, prompts))
+    with timed("gpt.groups"), profiled("conversation"):
+        return converse_groups(group_messages, rate_limiter, model, context_policy, context_window, usage_log,
+                               response_cache, journal, total=len(grouped))
+
+
+def converse_groups(group_messages, rate_limiter=None, model: str = "gpt-4.1-mini", context_policy: str = "full",
+                    context_window: int = 3, usage_log=None, response_cache=None, journal=None, total=None,
+                    on_reply=None, keep_groups=None):
+    """
+    Sends one request per group user message, in order, and accumulates the replies.
+
+    group_messages may be any iterable, e.g. a generator fed while frames are still being
+    extracted (see direct_conversation); total is only used for progress output.
+    on_reply(idx, reply, entry) is called as soon as each reply arrives. With keep_groups,
+    only the last keep_groups groups are kept in the returned history and summaries, so a
+    never-ending stream ("window" / "none" policy) runs in bounded memory.
+
+    Returns:
+        - message_history: user/assistant turns (compacted according to context_policy)
+        - summaries: list of GPT responses for each image group
+    """
     message_history = []
     summaries = []
-    total = len(grouped)
 
-    # Initialize request manager
-    request_mgr = RequestManager(requests_before_pause=8, pause_duration=60)
+    for idx, user_message in enumerate(group_messages):
+        progress = f"{idx + 1}/{total} ({int((idx + 1) / total * 100)}%)" if total else f"{idx + 1}"
+        print(f"📤 Sending group {progress} to GPT...")
 
-    for idx, group in enumerate(grouped):
-        percent = int((idx + 1) / total * 100)
-        print(f"📤 Sending group {idx + 1}/{total} ({percent}%) to GPT...")
-
-        group_prompt = {"type": "text", "text": prompt}
-        group_images = [
-            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{_to_base64(p)}"}}
-            for p in group
-        ]
-        user_message = {"role": "user", "content": [group_prompt] + group_images}
         message_history.append(user_message)
 
-        # Check if we need to pause
-        request_mgr.check_and_wait()
-
-        try:
-            response = openai.chat.completions.create(
-                model=model,
-                messages=message_history,
-                temperature=0.3,
-                max_tokens=1000
-            )
-            reply = response.choices[0].message
-            message_history.append({"role": "assistant", "content": reply.content})
-            summaries.append(reply.content)
-        except openai.RateLimitError as e:
-            print(f"\n⚠️ Rate limit hit. Pausing for 2 minutes...")
-            time.sleep(120)  # Wait for 2 minutes on rate limit error
-            print("▶️ Retrying request...\n")
-            # Retry the request
-            response = openai.chat.completions.create(
-                model=model,
-                messages=message_history,
-                temperature=0.3,
-                max_tokens=1000
-            )
-            reply = response.choices[0].message
-            message_history.append({"role": "assistant", "content": reply.content})
-            summaries.append(reply.content)
+        reply = journal.group_reply(idx) if journal is not None else None
+        entry = None
+        if reply is not None:
+            print("   ↩️ Restored from journal")
+        else:
+            request_messages = build_request_messages(message_history, context_policy, context_window)
+            reply, entry = _send_request(request_messages, model, f"group {idx + 1}", rate_limiter, response_cache, usage_log)
+            if journal is not None:
+                journal.record_group(idx, reply, entry)
+        message_history.append({"role": "assistant", "content": reply})
+        summaries.append(reply)
+        if on_reply is not None:
+            on_reply(idx, reply, entry)
+
+        # Drop images that later requests will not send, so memory stays bounded too
+        compact_history(message_history, context_policy, context_window)
+        if keep_groups is not None and len(summaries) > keep_groups:
+            del message_history[:-2 * keep_groups]
+            del summaries[:-keep_groups]
 
     return message_history, summaries
 
 
-def ask_followup_question(message_history, followup_questions, rate_limiter=None, model: str = "gpt-4.1-mini"):
+def ask_followup_question(message_history, followup_questions, rate_limiter=None, model: str = "gpt-4.1-mini",
+                          context_policy: str = "full", context_window: int = 3, usage_log=None, response_cache=None,
+                          journal=None):
     """
     Asks one or more follow-up questions based on the existing chat history.
 
     Parameters:
         - message_history: list of previous chat messages
         - followup_questions: list of strings (questions)
-        - rate_limiter: optional RateLimiter instance for managing API calls
+        - rate_limiter: optional TokenBucketLimiter; without one only the API's rate-limit headers pace requests
         - model: model name to use for completion
+        - context_policy / context_window: how much of the history to send (see build_request_messages)
+        - usage_log: optional list that receives per-request bytes and token usage
+        - response_cache: optional ResponseCache answering repeated requests from disk
+        - journal: optional RunJournal; answers already journaled are not asked again
 
     Returns:
         - List of (question, response) tuples
     """
     results = []
-    request_mgr = RequestManager(requests_before_pause=8, pause_duration=60)
-
-    for question in followup_questions:
-        print(f"💬 Asking follow-up: {question}")
-        message_history.append({"role": "user", "content": question})
-
-        request_mgr.check_and_wait()
-
-        try:
-            response = openai.chat.completions.create(
-                model=model,
-                messages=message_history,
-                temperature=0.3,
-                max_tokens=1000
-            )
-            reply = response.choices[0].message
-            message_history.append({"role": "assistant", "content": reply.content})
-            results.append((question, reply.content))
-        except openai.RateLimitError as e:
-            print(f"\n⚠️ Rate limit hit. Pausing for 2 minutes...")
-            time.sleep(120)
-            print("▶️ Retrying request...\n")
-            response = openai.chat.completions.create(
-                model=model,
-                messages=message_history,
-                temperature=0.3,
-                max_tokens=1000
-            )
-            reply = response.choices[0].message
-            message_history.append({"role": "assistant", "content": reply.content})
-            results.append((question, reply.content))
+
+    with timed("gpt.followups"), profiled("followups"):
+        for idx, question in enumerate(followup_questions):
+            print(f"💬 Asking follow-up: {question}")
+            message_history.append({"role": "user", "content": question})
+
+            reply = journal.followup_answer(idx, question) if journal is not None else None
+            if reply is not None:
+                print("   ↩️ Restored from journal")
+            else:
+                request_messages = build_request_messages(message_history, context_policy, context_window)
+                reply, entry = _send_request(request_messages, model, f"follow-up: {question}", rate_limiter, response_cache, usage_log)
+                if journal is not None:
+                    journal.record_followup(idx, question, reply, entry)
+            message_history.append({"role": "assistant", "content": reply})
+            results.append((question, reply))
 
     return results
\ No newline at end of file
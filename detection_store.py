@@ -0,0 +1,167 @@
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+STORE_FILENAME = "detections.npz"
+RAW_FOLDER = "raw"
+
+
+def result_to_detections(result):
+    """Converts one ultralytics Results object into plain arrays (boxes, confs, labels, bool masks)."""
+    boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32)
+    confs = result.boxes.conf.cpu().numpy().astype(np.float32)
+    labels = result.boxes.cls.cpu().numpy().astype(np.int16)
+    if result.masks is not None:
+        masks = result.masks.data.cpu().numpy() > 0.5
+    else:
+        masks = np.zeros((0, 1, 1), dtype=bool)
+    return {"boxes": boxes, "confs": confs, "labels": labels, "masks": masks}
+
+
+class DetectionStore:
+    """
+    Columnar store of per-frame detections, saved as one compressed .npz next to the frames.
+
+    Detections of all frames are concatenated; det_offsets[i]:det_offsets[i + 1] are the
+    rows of frame i. Masks are kept at the model's mask resolution and bit-packed.
+    """
+
+    def __init__(self, names=None):
+        self.names = dict(names or {})
+        self.frame_ids = []
+        self.filenames = []
+        self._frames = []
+        self._lock = threading.Lock()
+        self._arrays = None
+
+    def add(self, frame_id, filename, detections):
+        with self._lock:
+            self.frame_ids.append(frame_id)
+            self.filenames.append(filename)
+            self._frames.append(detections)
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def save(self, path):
+        order = np.argsort(self.frame_ids, kind="stable")
+        frames = [self._frames[i] for i in order]
+        counts = [len(f["boxes"]) for f in frames]
+        mask_shape = next((f["masks"].shape[1:] for f in frames if len(f["masks"])), (1, 1))
+
+        masks = [f["masks"] if len(f["masks"]) else np.zeros((len(f["boxes"]),) + mask_shape, dtype=bool) for f in frames]
+        all_masks = np.concatenate(masks) if masks else np.zeros((0,) + mask_shape, dtype=bool)
+
+        np.savez_compressed(
+            path,
+            frame_ids=np.asarray(self.frame_ids, dtype=np.int64)[order],
+            filenames=np.asarray(self.filenames)[order],
+            det_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            boxes=np.concatenate([f["boxes"] for f in frames]) if frames else np.zeros((0, 4), np.float32),
+            confs=np.concatenate([f["confs"] for f in frames]) if frames else np.zeros(0, np.float32),
+            labels=np.concatenate([f["labels"] for f in frames]) if frames else np.zeros(0, np.int16),
+            masks_packed=np.packbits(all_masks.reshape(len(all_masks), int(np.prod(mask_shape))), axis=1),
+            mask_shape=np.asarray(mask_shape, dtype=np.int64),
+            class_names=np.asarray([self.names.get(i, str(i)) for i in range(max(self.names, default=-1) + 1)]),
+        )
+        print(f"🗂 Saved detections for {len(self)} frames ({int(sum(counts))} objects) to '{path}'.")
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        store = cls(names=dict(enumerate(data["class_names"].tolist())))
+        store.frame_ids = data["frame_ids"].tolist()
+        store.filenames = data["filenames"].tolist()
+        store._arrays = {key: data[key] for key in data.files}
+        return store
+
+    def frame(self, index):
+        """Detections of the index-th stored frame, with masks unpacked to bool arrays."""
+        a = self._arrays
+        start, end = a["det_offsets"][index], a["det_offsets"][index + 1]
+        h, w = a["mask_shape"]
+        masks = np.unpackbits(a["masks_packed"][start:end], axis=1, count=h * w).reshape(-1, h, w).astype(bool)
+        return {"boxes": a["boxes"][start:end], "confs": a["confs"][start:end], "labels": a["labels"][start:end], "masks": masks}
+
+
+def render_batch(images, detections, detection=True, segmentation=True, class_id=None):
+    """
+    Draws the overlays of extract_frames (darkened grayscale background outside the
+    masks, blue boxes) onto a batch of same-sized frames.
+
+    The background compositing runs once over the whole batch instead of per frame.
+    """
+    if not images:
+        return []
+    height, width = images[0].shape[:2]
+    batch = np.stack(images)
+
+    if segmentation:
+        keep = np.zeros((len(images), height, width), dtype=bool)
+        for i, det in enumerate(detections):
+            selected = det["masks"] if class_id is None else det["masks"][np.isin(det["labels"], class_id)]
+            if len(selected):
+                combined = np.any(selected, axis=0).astype(np.uint8)
+                keep[i] = cv2.resize(combined, (width, height), interpolation=cv2.INTER_NEAREST).astype(bool)
+        has_mask = keep.reshape(len(images), -1).any(axis=1)
+
+        if has_mask.any():
+            # The frames stacked vertically are one tall image, so a single cvtColor converts the whole batch
+            selected = batch[has_mask]
+            n = len(selected)
+            gray = cv2.cvtColor(selected.reshape(n * height, width, 3), cv2.COLOR_BGR2GRAY).reshape(n, height, width)
+            dark = (gray * 0.5).astype(np.uint8)
+            batch[has_mask] = np.where(keep[has_mask][..., None], selected, dark[..., None])
+
+    rendered = list(batch)
+    if detection:
+        for image, det in zip(rendered, detections):
+            for box, label in zip(det["boxes"], det["labels"]):
+                if class_id is None or label in class_id:
+                    x1, y1, x2, y2 = map(int, box)
+                    cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
+    return rendered
+
+
+def render_folder(folder, detection=True, segmentation=True, class_id=None, out_folder=None, batch_size=16, workers=4):
+    """
+    Re-renders the overlaid frames of an extraction folder from its raw frames and detection store.
+
+    Parameters:
+        - folder: output/<trial>_<interval>s folder containing raw/ and detections.npz
+        - detection / segmentation: which overlays to draw
+        - class_id: list of class ids to draw, or None for all
+        - out_folder: where to write the rendered frames (default: folder itself, which is what GPT reads)
+        - batch_size: frames composited per vectorized batch
+        - workers: threads used for JPEG decoding/encoding
+    """
+    store = DetectionStore.load(os.path.join(folder, STORE_FILENAME))
+    out_folder = out_folder or folder
+    os.makedirs(out_folder, exist_ok=True)
+    raw_folder = os.path.join(folder, RAW_FOLDER)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(store), batch_size):
+            indices = range(start, min(start + batch_size, len(store)))
+            names = [store.filenames[i] for i in indices]
+            images = list(pool.map(lambda n: cv2.imread(os.path.join(raw_folder, n)), names))
+            rendered = render_batch(images, [store.frame(i) for i in indices], detection, segmentation, class_id)
+            list(pool.map(lambda item: cv2.imwrite(os.path.join(out_folder, item[0]), item[1]), zip(names, rendered)))
+
+    print(f"🎨 Rendered {len(store)} frames to '{out_folder}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render overlays from stored detections without re-running YOLO.")
+    parser.add_argument("folder", help="Extraction folder, e.g. output/my_video_trial_1s")
+    parser.add_argument("--class-id", type=int, nargs="+", help="Only draw these class ids (default: all)")
+    parser.add_argument("--no-boxes", action="store_true", help="Do not draw bounding boxes")
+    parser.add_argument("--no-masks", action="store_true", help="Do not darken the background outside masks")
+    parser.add_argument("--out", help="Output folder (default: overwrite the frames GPT reads)")
+    args = parser.parse_args()
+
+    render_folder(args.folder, detection=not args.no_boxes, segmentation=not args.no_masks,
+                  class_id=args.class_id, out_folder=args.out)
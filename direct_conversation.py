@@ -0,0 +1,95 @@
+import queue
+import threading
+from conversation_with_gpt import converse_groups, build_encoded_group_message
+from metrics import timed, profiled
+
+_DONE = object()
+
+
+def run_direct_conversation(video_path, data_name, trial_name, interval_seconds, group_size, prompt, rate_limiter=None,
+                            context_policy="full", context_window=3, usage_log=None, response_cache=None,
+                            image_max_size=800, jpeg_quality=85, journal=None, save_frames=False, extract_options=None,
+                            queue_size=None):
+    """
+    Extracts frames and sends them to GPT in one pass, without a disk round-trip.
+
+    Extraction runs in a background thread; every frame is resized and JPEG-encoded
+    once, straight from the decoded array, and handed over through a bounded queue.
+    Groups are sent as soon as they fill, so requests overlap with extraction. When
+    the GPT stage falls behind, the full queue pauses extraction.
+
+    Parameters:
+        - video_path, data_name, trial_name, interval_seconds: as for extract_frames
+        - group_size, prompt, rate_limiter, context_policy, context_window, usage_log,
+          response_cache, journal: as for start_conversation_with_images
+        - image_max_size / jpeg_quality: longest side and JPEG quality of the images sent to GPT
+        - save_frames: also write the full-size JPEGs to output/ as a side output
+        - extract_options: extra keyword arguments for extract_frames (detection, batch_size, ...)
+        - queue_size: frames buffered between extraction and GPT (default: 4 groups)
+
+    Returns:
+        - messages: full chat history
+        - summaries: list of GPT responses for each image group
+        - extraction_report: pipeline report of extract_frames
+    """
+    from extract_frames import extract_frames
+
+    frames = queue.Queue(maxsize=queue_size or group_size * 4)
+    stop = threading.Event()
+    outcome = {}
+
+    def sink(frame_id, timestamp_sec, encoded):
+        while not stop.is_set():
+            try:
+                frames.put(encoded, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("GPT stage stopped; aborting extraction")
+
+    def extract():
+        try:
+            outcome["report"] = extract_frames(video_path, data_name, trial_name, interval_seconds, save_frames=save_frames,
+                                               frame_sink=sink, sink_max_size=image_max_size, sink_quality=jpeg_quality,
+                                               headless=True, **(extract_options or {}))
+        except BaseException as e:  # extract_frames exits on unreadable videos
+            outcome["error"] = e
+        finally:
+            frames.put(_DONE)
+
+    def group_messages():
+        group = []
+        while True:
+            item = frames.get()
+            if item is _DONE:
+                break
+            group.append(item)
+            if len(group) == group_size:
+                yield build_encoded_group_message(group, prompt)
+                group = []
+        if group:
+            yield build_encoded_group_message(group, prompt)
+
+    worker = threading.Thread(target=extract, name="direct-extract", daemon=True)
+    worker.start()
+    try:
+        with timed("gpt.groups"), profiled("conversation"):
+            messages, summaries = converse_groups(group_messages(), rate_limiter, context_policy=context_policy,
+                                                  context_window=context_window, usage_log=usage_log,
+                                                  response_cache=response_cache, journal=journal)
+    finally:
+        stop.set()
+        # Unblock the sink if it is waiting on a full queue, then wait for extraction to wind down
+        while worker.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    if "error" in outcome:
+        raise RuntimeError(f"Frame extraction failed: {outcome['error']!r}") from outcome["error"]
+
+    print("\n=== Summary per group ===")
+    for i, s in enumerate(summaries):
+        print(f"[Group {i+1}] {s}")
+    return messages, summaries, outcome.get("report")
@@ -3,8 +3,14 @@ import os
 import argparse
 import subprocess
 import shutil
-from ultralytics import YOLO
 import numpy as np
+from frame_sampler import sample_frames, STRATEGIES
+from frame_pipeline import run_extraction_pipeline, print_pipeline_report
+from metrics import METRICS, profiled
+from image_prep import encode_array
+from detection_store import DetectionStore, result_to_detections, render_folder, STORE_FILENAME, RAW_FOLDER
+from yolo_backend import load_model, BACKENDS, DEFAULT_WEIGHTS
+from scene_tracker import SceneTracker, TRACKS_FILENAME, TRACKERS
 
 def reencode_video(input_path):
     base, _ = os.path.splitext(input_path)
@@ -26,7 +32,103 @@ def reencode_video(input_path):
     print("✅ Re-encoding successful.")
     return output_path
 
-def extract_frames(video_path, data_name, trial_name, interval_sec, detection = False, segmentation=False, class_id=None):
+def apply_detections(image, result, names, width, height, detection=False, segmentation=False, class_id=None):
+    """
+    Composites segmentation masks and draws bounding boxes for one YOLO result.
+
+    Parameters:
+        - image: BGR frame the result was computed on
+        - result: a single ultralytics Results object
+        - names: class id -> name mapping of the model
+        - width, height: frame size (masks are resized to it)
+        - detection / segmentation: which overlays to apply
+        - class_id: list of class ids to keep, or None for all
+
+    Returns:
+        - the overlaid image
+    """
+    boxes = result.boxes.xyxy.cpu().numpy()
+    confs = result.boxes.conf.cpu().numpy()
+    masks = result.masks.data.cpu().numpy() if result.masks is not None else np.empty((0, height, width))
+    labels = result.boxes.cls.cpu().numpy().astype(int)
+
+
+    if segmentation:
+        # Only include masks for labels in class_id (or all if class_id is None)
+        if class_id is not None:
+            selected_masks = [mask for mask, label in zip(masks, labels) if label in class_id]
+        else:
+            selected_masks = masks
+
+        if len(selected_masks) > 0:
+            combined_mask = np.any(selected_masks, axis=0).astype(np.uint8)
+
+            mask_resized = cv2.resize(combined_mask, (width, height), interpolation=cv2.INTER_NEAREST)
+
+            # Create a 3-channel mask
+            mask_3ch = np.stack([mask_resized]*3, axis=-1)  # (H, W, 3)
+
+            # Convert original image to grayscale and make it darker
+            gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Scale pixel values to make it darker (e.g., 50% brightness)
+            dark_gray_image = (gray_image * 0.5).astype(np.uint8)
+            gray_image_3ch = cv2.cvtColor(dark_gray_image, cv2.COLOR_GRAY2BGR)
+
+            # Composite image: color where mask == 1, grayscale elsewhere
+            image = np.where(mask_3ch == 1, image, gray_image_3ch)
+
+    if detection:
+        if boxes is not None:
+            for box, conf, label in zip(boxes, confs, labels):
+                if class_id is None or label in class_id:
+                    x1, y1, x2, y2 = map(int, box)
+                    label_name = names[label]
+                    cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
+                    # cv2.putText(image, f'{label_name} {conf:.2f}', (x1, y1 - 10),
+                    #             cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
+
+    if boxes is None:
+        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        dark_gray_image = (gray_image * 0.5).astype(np.uint8)
+        image = cv2.cvtColor(dark_gray_image, cv2.COLOR_GRAY2BGR)
+
+    return image
+
+
+def infer_batch(model, images, imgsz=640):
+    """Runs one YOLO call on a list of frames and returns one result per frame."""
+    return model(images, imgsz=imgsz, verbose=False)
+
+
+def extract_frames(video_path, data_name, trial_name, interval_sec, detection = False, segmentation=False, class_id=None, sampling="auto",
+                   batch_size=8, imgsz=640, headless=False, queue_size=16, writer_threads=4, export_detections=False,
+                   model=None, save_frames=True, frame_sink=None, sink_max_size=800, sink_quality=85, backend="torch",
+                   int8=False, track=False, tracker="bytetrack.yaml"):
+    """
+    Samples a frame every interval_sec seconds into output/<trial_name>_<interval_sec>s.
+
+    With export_detections, YOLO results of every class are stored in detections.npz and the
+    untouched frames in raw/; the overlaid frames GPT reads are then rendered from that store
+    (see detection_store.render_folder), so overlays and class filters can be changed later
+    without re-running inference.
+
+    A YOLO model that is already loaded can be passed as model (the batch runner keeps one
+    warm model per worker process); otherwise yolo11n-seg.pt is loaded when needed, on the
+    inference backend given by backend / int8 (see yolo_backend.load_model). ultralytics
+    is only imported once detection, segmentation or tracking is requested.
+
+    With track, frames go through model.track (tracker: "bytetrack.yaml" or "botsort.yaml")
+    one at a time in frame order, so every object keeps its id across the video; the tracked
+    objects of the classes in class_id and their proximity groups are written to tracks.json
+    (see scene_tracker). Tracking works on the sampled frames, so keep interval_sec short.
+
+    With frame_sink, every frame is also resized to sink_max_size, JPEG-encoded once at
+    sink_quality in the writer pool and handed over in order as
+    frame_sink(frame_id, timestamp_sec, base64_jpeg), so the GPT stage can start without
+    reading anything back from disk. save_frames=False then skips the JPEG files entirely.
+    """
+    if frame_sink is not None and export_detections:
+        raise ValueError("frame_sink hands over the overlaid frames directly; it cannot be combined with export_detections")
 
     # Try loading video
     vidcap = cv2.VideoCapture(video_path)
@@ -40,6 +142,8 @@ def extract_frames(video_path, data_name, trial_name, interval_sec, detection =
         vidcap.release()
         video_path = reencode_video(video_path)
         vidcap = cv2.VideoCapture(video_path)
+        width = int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = vidcap.get(cv2.CAP_PROP_FPS)
         total_frames = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
         if fps == 0.0 or total_frames == 0:
@@ -51,91 +155,103 @@ def extract_frames(video_path, data_name, trial_name, interval_sec, detection =
     print(f"🎞 Video FPS: {fps}, Total frames: {total_frames}, Saving every {frame_interval} frames.")
 
     output_folder = os.path.join("output", f"{trial_name}_{interval_sec}s")
-    os.makedirs(output_folder, exist_ok=True)
-
-    success, image = vidcap.read()
-    frame_id = 0
-    saved_count = 0
-
-    if detection or segmentation:
-        # Load YOLO model
-        model = YOLO("yolo11n-seg.pt")
-        print(f"▶️ Starting frame extraction and segmentation every {interval_sec}s ({frame_interval} frames).")
-
-    while frame_id < total_frames:
-
-        vidcap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
-        success, image = vidcap.read()
-
-        if not success:
-            print(f"⚠️ Failed to read frame {frame_id}")
-            break
-
-        if segmentation or detection:
-
-            results = model(image)
-
-            boxes = results[0].boxes.xyxy.cpu().numpy()
-            confs = results[0].boxes.conf.cpu().numpy()
-            masks = results[0].masks.data.cpu().numpy()
-            labels = results[0].boxes.cls.cpu().numpy().astype(int)
-
-
-            if segmentation:
-                # Only include masks for labels in class_id (or all if class_id is None)
-                if class_id is not None:
-                    selected_masks = [mask for mask, label in zip(masks, labels) if label in class_id]
-                else:
-                    selected_masks = masks
-
-                if selected_masks:
-                    combined_mask = np.any(selected_masks, axis=0).astype(np.uint8)
-
-                    mask_resized = cv2.resize(combined_mask, (width, height), interpolation=cv2.INTER_NEAREST)
-
-                    # Create a 3-channel mask
-                    mask_3ch = np.stack([mask_resized]*3, axis=-1)  # (H, W, 3)
-
-                    # Convert original image to grayscale and make it darker
-                    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    # Scale pixel values to make it darker (e.g., 50% brightness)
-                    dark_gray_image = (gray_image * 0.5).astype(np.uint8)
-                    gray_image_3ch = cv2.cvtColor(dark_gray_image, cv2.COLOR_GRAY2BGR)
-
-                    # Composite image: color where mask == 1, grayscale elsewhere
-                    image = np.where(mask_3ch == 1, image, gray_image_3ch)
-
-            if detection:
-                if boxes is not None:
-                    for box, conf, label in zip(boxes, confs, labels):
-                        if class_id is None or label in class_id:
-                            x1, y1, x2, y2 = map(int, box)
-                            label_name = model.names[label]
-                            cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                            # cv2.putText(image, f'{label_name} {conf:.2f}', (x1, y1 - 10),
-                            #             cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
-
-            if boxes is None:
-                gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                dark_gray_image = (gray_image * 0.5).astype(np.uint8)
-                image = cv2.cvtColor(dark_gray_image, cv2.COLOR_GRAY2BGR)
-
-
+    if save_frames:
+        os.makedirs(output_folder, exist_ok=True)
+
+    store = None
+    scene = None
+
+    if not (detection or segmentation or track):
+        model = None
+    else:
+        if model is None:
+            # Load YOLO model
+            model = load_model(DEFAULT_WEIGHTS, backend, imgsz, int8)
+        print(f"▶️ Starting frame extraction and segmentation every {interval_sec}s ({frame_interval} frames), batch size {batch_size}.")
+        if export_detections:
+            store = DetectionStore(model.names)
+            os.makedirs(os.path.join(output_folder, RAW_FOLDER), exist_ok=True)
+        if track:
+            scene = SceneTracker(model.names, tracker, class_id)
+
+    frames = sample_frames(vidcap, video_path, total_frames, frame_interval, width, height, strategy=sampling)
+
+    def frame_filename(frame_id):
         timestamp_sec = int(frame_id / fps)
-        filename = f"{data_name}_{timestamp_sec:04d}.jpg"
-        filepath = os.path.join(output_folder, filename)
-        cv2.imwrite(filepath, image)
-        saved_count += 1
-
-        if detection or segmentation:
-            cv2.imshow("Extracted Frame", image)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-
-        frame_id += frame_interval
+        return f"{data_name}_{timestamp_sec:04d}.jpg"
+
+    def process_batch(frame_ids, images):
+        if model is None:
+            return images
+        if scene is not None:
+            # ultralytics keeps one tracker per batch slot, so frames are tracked one by one;
+            # persist=False on the first frame starts fresh ids when a warm model is reused.
+            # Each frame is recorded before the next is tracked, so only that first frame resets.
+            results = []
+            for frame_id, image in zip(frame_ids, images):
+                result = model.track(image, persist=bool(scene.frames), tracker=tracker, imgsz=imgsz, verbose=False)[0]
+                scene.update(frame_id, frame_id / fps, frame_filename(frame_id), result)
+                results.append(result)
+        else:
+            results = infer_batch(model, images, imgsz=imgsz)
+        if store is not None:
+            for frame_id, result in zip(frame_ids, results):
+                store.add(frame_id, frame_filename(frame_id), result_to_detections(result))
+            return images
+        return [
+            apply_detections(image, result, model.names, width, height, detection, segmentation, class_id)
+            for image, result in zip(images, results)
+        ]
+
+    # frame_id -> base64 JPEG, filled by the writer pool and drained in order by on_frame
+    encoded_frames = {}
+
+    def write_frame(frame_id, image):
+        if save_frames:
+            folder = os.path.join(output_folder, RAW_FOLDER) if store is not None else output_folder
+            cv2.imwrite(os.path.join(folder, frame_filename(frame_id)), image)
+        if frame_sink is not None:
+            encoded_frames[frame_id] = encode_array(image, sink_max_size, sink_quality)
+
+    def show_frame(frame_id, image):
+        cv2.imshow("Extracted Frame", image)
+        return not (cv2.waitKey(1) & 0xFF == ord("q"))
+
+    show = (detection or segmentation) and not headless
+
+    def on_frame(frame_id, image):
+        if frame_sink is not None:
+            frame_sink(frame_id, int(frame_id / fps), encoded_frames.pop(frame_id))
+        if show:
+            return show_frame(frame_id, image)
+    with profiled("extract"):
+        saved_count, report = run_extraction_pipeline(
+            frames, process_batch, write_frame,
+            batch_size=batch_size if model is not None else 1,
+            queue_size=queue_size,
+            writer_threads=writer_threads,
+            on_frame=on_frame if show or frame_sink is not None else None
+        )
+    METRICS.add("extract.total", report["wall_seconds"])
+    for name, stage in report["stages"].items():
+        METRICS.add(f"extract.{name}", stage["busy_seconds"], stage["items"])
+    if show:
+        cv2.destroyAllWindows()
 
     vidcap.release()
-    print(f"✅ Done: Saved {saved_count} frames to '{output_folder}'.")
+    if scene is not None:
+        os.makedirs(output_folder, exist_ok=True)
+        scene.save(os.path.join(output_folder, TRACKS_FILENAME))
+    if store is not None:
+        store.save(os.path.join(output_folder, STORE_FILENAME))
+        with profiled("render"):
+            render_folder(output_folder, detection, segmentation, class_id)
+    if save_frames:
+        print(f"✅ Done: Saved {saved_count} frames to '{output_folder}'.")
+    else:
+        print(f"✅ Done: Extracted {saved_count} frames (not saved to disk).")
+    print_pipeline_report(report)
+    return report
 
 
 if __name__ == "__main__":
@@ -143,6 +259,20 @@ if __name__ == "__main__":
     parser.add_argument("video_path", help="Path to input video file (e.g., sample.mov or sample.mp4)")
     parser.add_argument("trial_name", help="Name of the trial (used in output folder naming)")
     parser.add_argument("interval_sec", type=int, help="Interval in seconds between frames")
+    parser.add_argument("--sampling", choices=STRATEGIES, default="auto", help="Frame sampling strategy (default: auto)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per YOLO call when detection/segmentation is on")
+    parser.add_argument("--imgsz", type=int, default=640, help="YOLO input resolution")
+    parser.add_argument("--writer-threads", type=int, default=4, help="Threads encoding and writing JPEGs")
+    parser.add_argument("--detect", action="store_true", help="Run YOLO detection + segmentation")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="YOLO inference backend (default: torch)")
+    parser.add_argument("--int8", action="store_true", help="Use an int8-quantized export (onnx / openvino)")
+    parser.add_argument("--track", action="store_true", help="Track objects across frames and write tracks.json")
+    parser.add_argument("--tracker", choices=TRACKERS, default="bytetrack.yaml", help="Tracker used with --track")
+    parser.add_argument("--export-detections", action="store_true",
+                        help="Store detections in detections.npz and render overlays from it (see detection_store.py)")
 
     args = parser.parse_args()
-    extract_frames(args.video_path, args.trial_name, args.interval_sec, detection=False, segmentation=False, class_id=None)
\ No newline at end of file
+    extract_frames(args.video_path, args.trial_name, args.trial_name, args.interval_sec, detection=args.detect, segmentation=args.detect, class_id=None,
+                   sampling=args.sampling, batch_size=args.batch_size, imgsz=args.imgsz, headless=True,
+                   writer_threads=args.writer_threads, export_detections=args.export_detections,
+                   backend=args.backend, int8=args.int8, track=args.track, tracker=args.tracker)
\ No newline at end of file
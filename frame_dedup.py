@@ -0,0 +1,77 @@
+from PIL import Image
+
+DEDUP_METHODS = ("dhash", "histogram")
+
+# Frames closer than this to the last kept frame are dropped
+DEFAULT_THRESHOLDS = {
+    "dhash": 4,         # differing bits out of 64
+    "histogram": 0.1,   # total variation distance of grayscale histograms, 0..1
+}
+
+
+def _open_small(path, size):
+    img = Image.open(path)
+    # JPEG can decode straight to a reduced scale, which is most of the speed-up here
+    img.draft("L", size)
+    return img.convert("L")
+
+
+def dhash(path, hash_size=8):
+    """Difference hash of an image as an int of hash_size * hash_size bits."""
+    with _open_small(path, (hash_size * 8, hash_size * 8)) as img:
+        # One byte per pixel in "L" mode, row by row
+        pixels = img.resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR).tobytes()
+
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def gray_histogram(path):
+    """Normalized 256-bin grayscale histogram."""
+    with _open_small(path, (256, 256)) as img:
+        hist = img.histogram()
+    total = float(sum(hist)) or 1.0
+    return [h / total for h in hist]
+
+
+def _signature(path, method):
+    return dhash(path) if method == "dhash" else gray_histogram(path)
+
+
+def _distance(a, b, method):
+    if method == "dhash":
+        return bin(a ^ b).count("1")
+    return 0.5 * sum(abs(x - y) for x, y in zip(a, b))
+
+
+def select_keyframes(image_paths, method="dhash", threshold=None):
+    """
+    Drops frames that are near-duplicates of the last kept frame.
+
+    Parameters:
+        - image_paths: frame paths in temporal order
+        - method: "dhash" (perceptual hash) or "histogram" (grayscale histogram distance)
+        - threshold: maximum distance still considered a duplicate (method default if None)
+
+    Returns:
+        - the kept paths, in their original order (filenames and timestamps untouched)
+    """
+    if method not in DEDUP_METHODS:
+        raise ValueError(f"Unknown dedup method: {method} (choose from {', '.join(DEDUP_METHODS)})")
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+
+    kept = []
+    last = None
+    for path in image_paths:
+        signature = _signature(path, method)
+        if last is not None and _distance(signature, last, method) <= threshold:
+            continue
+        kept.append(path)
+        last = signature
+    return kept
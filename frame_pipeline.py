@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class StageStats:
+    """Busy time, item count and queue occupancy samples for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.queue_samples = []
+        self.queue_capacity = None
+        self._lock = threading.Lock()
+
+    def record(self, count, seconds, q=None):
+        with self._lock:
+            self.items += count
+            self.busy_seconds += seconds
+            if q is not None:
+                self.queue_samples.append(q.qsize())
+                self.queue_capacity = q.maxsize
+
+    def summary(self):
+        samples = self.queue_samples
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds > 0 else None,
+            "queue_avg": round(sum(samples) / len(samples), 2) if samples else None,
+            "queue_max": max(samples) if samples else None,
+            "queue_capacity": self.queue_capacity,
+        }
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up once the pipeline is stopped, so no thread hangs on a full queue.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _decode_worker(frames, decode_q, stats, stop, errors):
+    try:
+        iterator = iter(frames)
+        while not stop.is_set():
+            start = time.perf_counter()
+            item = next(iterator, _DONE)
+            if item is _DONE:
+                break
+            stats.record(1, time.perf_counter() - start, decode_q)
+            if not _put(decode_q, item, stop):
+                return
+        _put(decode_q, _DONE, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+
+def _infer_worker(decode_q, out_q, process_batch, write_frame, pool, batch_size, stats, stop, errors):
+    try:
+        done = False
+        while not done:
+            batch = []
+            while len(batch) < batch_size:
+                item = _get(decode_q, stop)
+                if item is None:
+                    return
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+
+            if not batch:
+                break
+
+            start = time.perf_counter()
+            images = process_batch([frame_id for frame_id, _ in batch], [image for _, image in batch])
+            stats.record(len(batch), time.perf_counter() - start, decode_q)
+
+            for (frame_id, _), image in zip(batch, images):
+                future = pool.submit(write_frame, frame_id, image)
+                if not _put(out_q, (frame_id, image, future), stop):
+                    return
+        _put(out_q, _DONE, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+
+def run_extraction_pipeline(frames, process_batch, write_frame, batch_size=1, queue_size=16, writer_threads=4, on_frame=None):
+    """
+    Runs decode -> inference -> encode/write as concurrent stages connected by bounded queues.
+
+    Parameters:
+        - frames: iterable of (frame_id, image), consumed by the decoder thread
+        - process_batch: function(frame_ids, images) -> list of images, run by the inference thread
+        - write_frame: function(frame_id, image), run in the writer thread pool
+        - batch_size: number of frames handed to process_batch at once
+        - queue_size: capacity of each inter-stage queue (backpressure bound)
+        - writer_threads: size of the encode/write thread pool
+        - on_frame: optional function(frame_id, image) called in order on the calling thread
+          after the frame is written; returning False stops the pipeline
+
+    Returns:
+        - saved_count: number of frames written (including in-flight ones when stopped early)
+        - report: dict with wall time and per-stage throughput / queue occupancy
+    """
+    stop = threading.Event()
+    errors = []
+    decode_q = queue.Queue(maxsize=queue_size)
+    out_q = queue.Queue(maxsize=queue_size)
+    decode_stats = StageStats("decode")
+    infer_stats = StageStats("infer")
+    write_stats = StageStats("write")
+
+    def timed_write(frame_id, image):
+        start = time.perf_counter()
+        write_frame(frame_id, image)
+        write_stats.record(1, time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    # Named threads so profilers (py-spy --threads) show which stage is busy
+    pool = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="extract-write")
+    threads = [
+        threading.Thread(target=_decode_worker, args=(frames, decode_q, decode_stats, stop, errors),
+                         name="extract-decode", daemon=True),
+        threading.Thread(target=_infer_worker, args=(decode_q, out_q, process_batch, timed_write, pool,
+                                                     batch_size, infer_stats, stop, errors),
+                         name="extract-infer", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = _get(out_q, stop)
+            if item is None or item is _DONE:
+                break
+            frame_id, image, future = item
+            # Record output occupancy here: a full out_q means writers/display are the bottleneck
+            write_stats.queue_samples.append(out_q.qsize())
+            write_stats.queue_capacity = out_q.maxsize
+            future.result()
+            if on_frame is not None and on_frame(frame_id, image) is False:
+                break
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        # Frames already handed to the writers are still written; queued ones are dropped
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    if errors:
+        raise errors[0]
+
+    saved_count = write_stats.items
+    wall = time.perf_counter() - wall_start
+    report = {
+        "wall_seconds": round(wall, 3),
+        "frames_per_second": round(saved_count / wall, 2) if wall > 0 else None,
+        "stages": {s.name: s.summary() for s in (decode_stats, infer_stats, write_stats)},
+    }
+    return saved_count, report
+
+
+def print_pipeline_report(report):
+    print(f"📊 Pipeline report: {report['wall_seconds']}s wall, {report['frames_per_second']} frames/s")
+    for name, s in report["stages"].items():
+        rate = f"{s['items_per_second']} items/s busy" if s["items_per_second"] is not None else "idle"
+        occupancy = (f", queue avg {s['queue_avg']}/{s['queue_capacity']} max {s['queue_max']}"
+                     if s["queue_avg"] is not None else "")
+        print(f"   {name:<7}: {s['items']} items, {rate}{occupancy}")
@@ -0,0 +1,159 @@
+import bisect
+import shutil
+import subprocess
+import cv2
+import numpy as np
+
+# Intervals up to this many frames are cheaper to decode straight through than to seek.
+# Roughly the GOP length of typical H.264/HEVC camera footage.
+SEEK_THRESHOLD_FRAMES = 250
+
+STRATEGIES = ("auto", "sequential", "seek", "ffmpeg")
+
+
+def sample_frame_ids(total_frames, frame_interval):
+    """Frame indices that extract_frames saves: 0, interval, 2*interval, ..."""
+    return list(range(0, total_frames, max(frame_interval, 1)))
+
+
+def choose_strategy(frame_interval, strategy="auto", seek_threshold=SEEK_THRESHOLD_FRAMES):
+    """
+    Picks a sampling strategy for the given interval.
+
+    Dense intervals are decoded sequentially with grab()/retrieve(), sparse ones
+    jump between keyframes. The ffmpeg pipe is only used when asked for explicitly.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {strategy} (choose from {', '.join(STRATEGIES)})")
+    if strategy != "auto":
+        return strategy
+    return "sequential" if frame_interval <= seek_threshold else "seek"
+
+
+def probe_keyframes(video_path, fps):
+    """
+    Returns the sorted frame indices of keyframes using ffprobe, or None if
+    ffprobe is not available or fails.
+    """
+    if shutil.which("ffprobe") is None:
+        return None
+
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-skip_frame", "nokey", "-show_entries", "frame=pts_time",
+        "-of", "csv=p=0", video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        return None
+
+    keyframes = set()
+    for line in result.stdout.decode().splitlines():
+        line = line.strip().rstrip(",")
+        if not line or line == "N/A":
+            continue
+        keyframes.add(int(round(float(line) * fps)))
+    return sorted(keyframes) or None
+
+
+def _iter_sequential(vidcap, frame_ids):
+    # grab() only demuxes/decodes; retrieve() does the colour conversion we actually need.
+    current = 0
+    for target in frame_ids:
+        while current < target:
+            if not vidcap.grab():
+                print(f"⚠️ Failed to read frame {current}")
+                return
+            current += 1
+
+        if not vidcap.grab():
+            print(f"⚠️ Failed to read frame {target}")
+            return
+        success, image = vidcap.retrieve()
+        current += 1
+        if not success:
+            print(f"⚠️ Failed to read frame {target}")
+            return
+        yield target, image
+
+
+def _iter_keyframe_seek(vidcap, frame_ids, keyframes, seek_threshold):
+    # Seek only when the target lies in a later GOP than the decoder position,
+    # otherwise decoding forward is never more work than the seek would be.
+    current = 0
+    for target in frame_ids:
+        if keyframes:
+            nearest = keyframes[bisect.bisect_right(keyframes, target) - 1] if target >= keyframes[0] else 0
+            should_seek = nearest > current
+        else:
+            should_seek = target - current > seek_threshold
+
+        if should_seek:
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            current = target
+
+        while current < target:
+            if not vidcap.grab():
+                print(f"⚠️ Failed to read frame {current}")
+                return
+            current += 1
+
+        success, image = vidcap.read()
+        current += 1
+        if not success:
+            print(f"⚠️ Failed to read frame {target}")
+            return
+        yield target, image
+
+
+def _iter_ffmpeg(video_path, frame_ids, frame_interval, width, height):
+    # Let ffmpeg decode and drop frames, and stream only the kept ones as raw BGR.
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", video_path,
+        "-vf", f"select=not(mod(n\\,{max(frame_interval, 1)}))",
+        "-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"
+    ]
+    frame_size = width * height * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_size)
+    try:
+        for target in frame_ids:
+            buffer = proc.stdout.read(frame_size)
+            if len(buffer) < frame_size:
+                print(f"⚠️ Failed to read frame {target}")
+                return
+            yield target, np.frombuffer(buffer, dtype=np.uint8).reshape((height, width, 3)).copy()
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def sample_frames(vidcap, video_path, total_frames, frame_interval, width, height,
+                  strategy="auto", seek_threshold=SEEK_THRESHOLD_FRAMES):
+    """
+    Yields (frame_id, image) for every sampled frame of the video.
+
+    Parameters:
+        - vidcap: opened cv2.VideoCapture positioned at the first frame
+        - video_path: path of the same video (used by the ffmpeg strategy)
+        - total_frames: number of frames in the video
+        - frame_interval: distance between sampled frames
+        - width, height: frame size reported by the capture
+        - strategy: "auto", "sequential", "seek" or "ffmpeg"
+        - seek_threshold: interval (in frames) above which "auto" switches to seeking
+    """
+    frame_ids = sample_frame_ids(total_frames, frame_interval)
+    strategy = choose_strategy(frame_interval, strategy, seek_threshold)
+
+    if strategy == "ffmpeg" and shutil.which("ffmpeg") is None:
+        print("⚠️ ffmpeg not found, falling back to sequential decoding.")
+        strategy = "sequential"
+
+    print(f"🧭 Sampling strategy: {strategy}")
+
+    if strategy == "sequential":
+        return _iter_sequential(vidcap, frame_ids)
+    if strategy == "seek":
+        fps = vidcap.get(cv2.CAP_PROP_FPS)
+        return _iter_keyframe_seek(vidcap, frame_ids, probe_keyframes(video_path, fps), seek_threshold)
+    return _iter_ffmpeg(video_path, frame_ids, frame_interval, width, height)
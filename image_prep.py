@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from PIL import Image
+from metrics import METRICS
+
+IMAGE_CACHE_DIR = os.path.join("cache", "images")
+
+# (path, mtime, size params) -> base64 JPEG, most recently used last
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+MEMO_LIMIT = 2048
+
+# Encoding pools by worker count, shared by every caller of prepare_images
+_pools = {}
+_pools_lock = threading.Lock()
+# None = the platform default (fork on Linux); see set_pool_start_method
+_pool_start_method = None
+
+
+def _crop_image(img, crop):
+    # One box is a plain crop; several boxes are cut out and tiled into one grid image
+    if len(crop) == 1:
+        return img.crop(crop[0])
+    tiles = [img.crop(box) for box in crop]
+    cols = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / cols)
+    cell_w = max(t.size[0] for t in tiles)
+    cell_h = max(t.size[1] for t in tiles)
+    sheet = Image.new("RGB", (cols * cell_w, rows * cell_h), (32, 32, 32))
+    for i, tile in enumerate(tiles):
+        sheet.paste(tile, ((i % cols) * cell_w, (i // cols) * cell_h))
+    return sheet
+
+
+def resize_image(image_path, max_size=800, quality=85, crop=None):
+    """Resize image to reduce token usage while maintaining quality"""
+    with Image.open(image_path) as img:
+        if crop:
+            # crop: tuple of (x1, y1, x2, y2) pixel boxes, see roi_crop.compute_crops
+            img = _crop_image(img.convert("RGB"), crop)
+
+        # Calculate new size maintaining aspect ratio
+        ratio = min(max_size / max(img.size[0], img.size[1]), 1.0)
+        new_size = tuple(int(dim * ratio) for dim in img.size)
+
+        if ratio < 1.0:  # Only resize if image is larger than max_size
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+        # Save to bytes
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+
+def encode_array(image, max_size=800, quality=85):
+    """Resizes a BGR frame (numpy array) and returns it as a base64 JPEG, without touching disk."""
+    height, width = image.shape[:2]
+    ratio = min(max_size / max(width, height), 1.0)
+    if ratio < 1.0:
+        image = cv2.resize(image, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return base64.b64encode(buffer.tobytes()).decode("utf-8")
+
+
+def estimate_image_tokens(width, height, detail="high"):
+    """
+    Prompt tokens of one image of the given size, following OpenAI's published rule:
+    fit in 2048x2048, scale the short side down to 768, then 170 per 512 px tile + 85.
+    """
+    if detail == "low":
+        return 85
+    scale = min(2048 / max(width, height), 1.0)
+    width, height = width * scale, height * scale
+    scale = min(768 / min(width, height), 1.0)
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def encoded_image_size(encoded):
+    """(width, height) of a base64 JPEG, read from its header."""
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+        return img.size
+
+
+def _memo_key(path, max_size, quality, crop=None):
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns, max_size, quality)
+    return key + (crop,) if crop else key
+
+
+def _sidecar_path(key, cache_dir):
+    digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, digest[:2], digest + ".jpg")
+
+
+def _remember(key, encoded):
+    with _memo_lock:
+        _memo[key] = encoded
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_LIMIT:
+            _memo.popitem(last=False)
+
+
+def _encode_job(args):
+    # Runs in a worker process: resize + encode one frame and persist it to the sidecar cache
+    path, max_size, quality, sidecar, crop = args
+    data = resize_image(path, max_size, quality, crop)
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    tmp = f"{sidecar}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, sidecar)
+    return base64.b64encode(data).decode("utf-8")
+
+
+def get_base64(path, max_size=800, quality=85, cache_dir=IMAGE_CACHE_DIR, crop=None):
+    """
+    Returns the resized JPEG of path (or of its crop boxes) as base64, from memory,
+    the sidecar cache or (as a last resort) by encoding it now.
+    """
+    start = time.perf_counter()
+    key = _memo_key(path, max_size, quality, crop)
+    with _memo_lock:
+        encoded = _memo.get(key)
+        if encoded is not None:
+            _memo.move_to_end(key)
+            METRICS.add("images.lookup", time.perf_counter() - start)
+            return encoded
+
+    sidecar = _sidecar_path(key, cache_dir)
+    if os.path.exists(sidecar):
+        with open(sidecar, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("utf-8")
+    else:
+        encoded = _encode_job((path, max_size, quality, sidecar, crop))
+    _remember(key, encoded)
+    METRICS.add("images.lookup", time.perf_counter() - start)
+    return encoded
+
+
+def set_pool_start_method(method):
+    """
+    Start method of the encoding pool, e.g. "spawn" for callers that encode from threads.
+
+    Forking a process with running threads is unsafe, so batch_runner.py switches to
+    "spawn" before its GPT threads start. spawn re-imports the main module in every
+    worker, which only works when that module keeps its work behind a __main__ guard,
+    so single runs (runThis.py) keep the default.
+    """
+    global _pool_start_method
+    with _pools_lock:
+        _pool_start_method = method
+
+
+def _encode_pool(workers):
+    # One pool is shared so concurrent runs don't each start a full set of processes
+    with _pools_lock:
+        if workers not in _pools:
+            ctx = multiprocessing.get_context(_pool_start_method)
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        return _pools[workers]
+
+
+def prepare_images(paths, max_size=800, quality=85, workers=None, cache_dir=IMAGE_CACHE_DIR, crops=None):
+    """
+    Encodes every frame of a run ahead of time so the request loop only does lookups.
+
+    Frames already in memory or in the sidecar cache are skipped; the rest are
+    resized and JPEG-encoded in a process pool shared by all callers. crops
+    optionally maps a path to the crop boxes to encode instead of the full frame.
+
+    Returns:
+        - number of frames that had to be encoded
+    """
+    jobs = []
+    crops = crops or {}
+    for path in paths:
+        crop = crops.get(path)
+        key = _memo_key(path, max_size, quality, crop)
+        with _memo_lock:
+            if key in _memo:
+                continue
+        sidecar = _sidecar_path(key, cache_dir)
+        if os.path.exists(sidecar):
+            continue
+        jobs.append((key, (path, max_size, quality, sidecar, crop)))
+
+    if not jobs:
+        return 0
+
+    print(f"🖼 Preparing {len(jobs)} images (max {max_size}px, quality {quality})...")
+    start = time.perf_counter()
+    if len(jobs) < 8 or workers == 1:
+        # Not worth starting a process pool for a handful of frames
+        encoded = [_encode_job(args) for _, args in jobs]
+    else:
+        encoded = list(_encode_pool(workers).map(_encode_job, [args for _, args in jobs], chunksize=4))
+
+    for (key, _), data in zip(jobs, encoded):
+        _remember(key, data)
+    METRICS.add("images.prepare", time.perf_counter() - start, len(jobs))
+    return len(jobs)
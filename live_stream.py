@@ -0,0 +1,285 @@
+# live_stream.py
+# Near-real-time analysis of a live source: an RTSP/HTTP camera, a local device,
+# or a recording that is still being written.
+# 실시간 카메라(RTSP), 장치 또는 녹화 중인 파일을 바로 분석합니다.
+#
+# Frames are sampled on wall-clock time, encoded in memory, and sent to GPT as soon
+# as a group fills. Each reply is appended to log/<name>_live_<timestamp>.jsonl
+# right away. Memory stays bounded: the frame buffer is a bounded queue that drops
+# the oldest frames when GPT falls behind, and only the last context_window groups
+# are kept in the history.
+#
+# Usage:
+#   python live_stream.py rtsp://camera.local/stream --interval 2 --group-size 5
+#   python live_stream.py 0 --interval 1                        # webcam / capture device 0
+#   python live_stream.py ./vid/recording.ts --follow           # file still being written
+#   python live_stream.py ./vid/my_video.mp4 --replay           # replay a file in real time (testing)
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import cv2
+from conversation_with_gpt import converse_groups, build_encoded_group_message
+from image_prep import encode_array
+from rate_limit import TokenBucketLimiter
+
+
+class LiveCapture:
+    """
+    Reads frames from a live source and yields (capture_time, frame), one per interval.
+
+    - replay: a finished file is played back at its own frame rate, as if it were live
+    - follow: a file still being written; at the current end, wait for it to grow
+    - otherwise (camera, device, stream URL): reconnect after read failures
+
+    Capture time is the wall clock for cameras and streams; for files (replay/follow)
+    it is the session start plus the file's own timeline. The source counts as ended
+    once no frame arrived for idle_timeout seconds (a replayed file ends at its last frame).
+
+    Every frame is grabbed so the source never lags behind, but only the first frame of
+    each interval_sec window of capture time is decoded; a 30 fps camera sampled every
+    second costs one decode per second instead of thirty.
+    """
+
+    def __init__(self, source, replay=False, follow=False, idle_timeout=30.0, reconnect_delay=0.5):
+        self.source = int(source) if str(source).isdigit() else source
+        self.replay = replay
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.frames_read = 0
+        self.reconnects = 0
+        self._vidcap = None
+
+    def _open(self):
+        if self._vidcap is not None:
+            self._vidcap.release()
+        self._vidcap = cv2.VideoCapture(self.source)
+        # Keep the driver-side buffer short so frames are fresh rather than queued up
+        self._vidcap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if self.follow and self.frames_read:
+            self._vidcap.set(cv2.CAP_PROP_POS_FRAMES, self.frames_read)
+        return self._vidcap.isOpened()
+
+    def frames(self, stop, interval_sec=0.0):
+        self._open()
+        fps = self._vidcap.get(cv2.CAP_PROP_FPS) or 30.0
+        started = time.monotonic()
+        started_wall = time.time()
+        last_frame = time.monotonic()
+        next_due = None
+
+        try:
+            while not stop.is_set():
+                if self._vidcap.grab():
+                    self.frames_read += 1
+                    last_frame = time.monotonic()
+                    if self.replay:
+                        # Hold each frame back until its presentation time
+                        delay = started + self.frames_read / fps - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    # Files arrive in bursts (after each reopen); their own timeline is the clock
+                    captured_at = started_wall + self.frames_read / fps if self.replay or self.follow else time.time()
+                    if next_due is not None and captured_at < next_due:
+                        continue
+                    ok, image = self._vidcap.retrieve()
+                    if ok:
+                        next_due = captured_at + interval_sec
+                        yield captured_at, image
+                    continue
+
+                if self.replay:
+                    return
+                if time.monotonic() - last_frame > self.idle_timeout:
+                    print(f"⏹ No frames from {self.source} for {self.idle_timeout:.0f}s, stopping.")
+                    return
+                time.sleep(self.reconnect_delay)
+                self.reconnects += 1
+                self._open()
+        finally:
+            self._vidcap.release()
+
+
+class LiveLog:
+    """JSONL log of a live session; one line per group, flushed and fsynced as soon as it is written."""
+
+    def __init__(self, path, config):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._append({"type": "live", "started": datetime.now().isoformat(timespec="seconds"), "config": config})
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_group(self, index, captured_from, captured_to, reply, usage=None, dropped_frames=0):
+        self._append({
+            "type": "group",
+            "index": index,
+            "captured_from": captured_from,
+            "captured_to": captured_to,
+            "reply": reply,
+            "usage": usage,
+            "dropped_frames": dropped_frames,
+        })
+
+    def close(self):
+        self._file.close()
+
+
+def run_live(source, interval_sec, group_size, prompt, rate_limiter=None, context_policy="window", context_window=3,
+             replay=False, follow=False, idle_timeout=30.0, detection=False, segmentation=False, class_id=None,
+             image_max_size=800, jpeg_quality=85, queue_groups=2, max_groups=None, log_path=None, backend="torch"):
+    """
+    Analyzes a live source until it ends, max_groups groups are answered or Ctrl+C.
+
+    Parameters:
+        - source: RTSP/HTTP URL, device index (e.g. "0") or file path
+        - interval_sec: wall-clock seconds between sampled frames
+        - group_size / prompt: frames per request and the group prompt
+        - rate_limiter: shared TokenBucketLimiter
+        - context_policy / context_window: "window" or "none" (the others grow without bound)
+        - replay / follow / idle_timeout: see LiveCapture
+        - detection / segmentation / class_id: YOLO overlays, as in extract_frames
+        - backend: YOLO inference backend (see yolo_backend.load_model)
+        - image_max_size / jpeg_quality: size and quality of the images sent to GPT
+        - queue_groups: groups of frames buffered while GPT is busy; older frames are dropped beyond that
+        - max_groups: stop after this many groups (None = run until the source ends)
+        - log_path: JSONL output (default: log/<name>_live_<timestamp>.jsonl)
+
+    Returns:
+        - path of the live log
+    """
+    if context_policy not in ("window", "none"):
+        print(f"⚠️ Context policy '{context_policy}' keeps growing on an endless stream; using 'window'.")
+        context_policy = "window"
+
+    name = "device" + str(source) if str(source).isdigit() else os.path.splitext(os.path.basename(str(source).rstrip("/")))[0]
+    log_path = log_path or os.path.join("log", f"{name}_live_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    config = {"source": str(source), "interval_seconds": interval_sec, "group_size": group_size, "group_prompt": prompt,
+              "context_policy": context_policy, "context_window": context_window,
+              "image_max_size": image_max_size, "jpeg_quality": jpeg_quality}
+    live_log = LiveLog(log_path, config)
+
+    process = None
+    if detection or segmentation:
+        from yolo_backend import load_model, DEFAULT_WEIGHTS
+        from extract_frames import infer_batch, apply_detections
+        model = load_model(DEFAULT_WEIGHTS, backend)
+
+        def process(image):
+            height, width = image.shape[:2]
+            result = infer_batch(model, [image])[0]
+            return apply_detections(image, result, model.names, width, height, detection, segmentation, class_id)
+
+    capture = LiveCapture(source, replay=replay, follow=follow, idle_timeout=idle_timeout)
+    frames = queue.Queue(maxsize=max(queue_groups, 1) * group_size)
+    stop = threading.Event()
+    counters = {"sampled": 0, "dropped": 0}
+    done = object()
+
+    def offer(item):
+        while True:
+            try:
+                frames.put_nowait(item)
+                return
+            except queue.Full:
+                # GPT is behind: drop the oldest frame instead of stalling the capture
+                try:
+                    frames.get_nowait()
+                    counters["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def capture_loop():
+        try:
+            for captured_at, image in capture.frames(stop, interval_sec):
+                if process is not None:
+                    image = process(image)
+                counters["sampled"] += 1
+                offer((captured_at, encode_array(image, image_max_size, jpeg_quality)))
+        except Exception as e:
+            print(f"❌ Capture failed: {e!r}")
+        finally:
+            offer(done)
+
+    # Capture time range of every group still waiting for its reply
+    pending = {}
+
+    def group_messages():
+        group = []
+        index = 0
+        dropped_before = 0
+        while not stop.is_set():
+            item = frames.get()
+            if item is not done:
+                group.append(item)
+            if group and (len(group) == group_size or item is done):
+                captured = [datetime.fromtimestamp(t).isoformat(timespec="seconds") for t, _ in group]
+                # Frames dropped since the previous group, i.e. missing just before this one
+                dropped = counters["dropped"]
+                pending[index] = (captured[0], captured[-1], dropped - dropped_before)
+                dropped_before = dropped
+                text = f"{prompt}\nThese frames were captured between {captured[0]} and {captured[-1]}."
+                yield build_encoded_group_message([e for _, e in group], text)
+                group = []
+                index += 1
+                if max_groups is not None and index >= max_groups:
+                    return
+            if item is done:
+                return
+
+    def on_reply(idx, reply, entry):
+        captured_from, captured_to, dropped = pending.pop(idx)
+        live_log.record_group(idx, captured_from, captured_to, reply, entry, dropped)
+        print(f"🟢 [{captured_from} → {captured_to}] {reply}")
+
+    worker = threading.Thread(target=capture_loop, name="live-capture", daemon=True)
+    worker.start()
+    print(f"📡 Live analysis of {source}: a frame every {interval_sec}s, groups of {group_size} → {log_path}")
+    try:
+        converse_groups(group_messages(), rate_limiter, context_policy=context_policy, context_window=context_window,
+                        on_reply=on_reply, keep_groups=context_window)
+    except KeyboardInterrupt:
+        print("\n⏹ Stopped by user.")
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+        live_log.close()
+
+    print(f"✅ Live session ended: {counters['sampled']} frames sampled, {counters['dropped']} dropped, "
+          f"{capture.reconnects} reconnects. Log: {log_path}")
+    return log_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze a live camera, stream or growing recording with GPT.")
+    parser.add_argument("source", help="RTSP/HTTP URL, device index (e.g. 0) or video file")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between sampled frames (wall clock)")
+    parser.add_argument("--group-size", type=int, default=5, help="Frames per GPT request")
+    parser.add_argument("--prompt", default="You will be shown a sequence of images. These images are consecutive frames "
+                                            "captured from a live camera, in temporal order. Describe what happens.")
+    parser.add_argument("--context-policy", choices=["window", "none"], default="window")
+    parser.add_argument("--context-window", type=int, default=3, help="Earlier groups kept as context")
+    parser.add_argument("--replay", action="store_true", help="Play a finished file back in real time (testing)")
+    parser.add_argument("--follow", action="store_true", help="Source is a file that is still being written")
+    parser.add_argument("--idle-timeout", type=float, default=30.0, help="Stop after this many seconds without frames")
+    parser.add_argument("--detect", action="store_true", help="Run YOLO detection + segmentation overlays")
+    parser.add_argument("--backend", choices=["torch", "onnx", "openvino"], default="torch", help="YOLO inference backend")
+    parser.add_argument("--max-groups", type=int, help="Stop after this many groups")
+    parser.add_argument("--requests-per-minute", type=int, default=20)
+    parser.add_argument("--tokens-per-minute", type=int, default=200000)
+    args = parser.parse_args()
+
+    run_live(args.source, args.interval, args.group_size, args.prompt,
+             rate_limiter=TokenBucketLimiter(args.requests_per_minute, args.tokens_per_minute),
+             context_policy=args.context_policy, context_window=args.context_window, replay=args.replay,
+             follow=args.follow, idle_timeout=args.idle_timeout, detection=args.detect, segmentation=args.detect,
+             max_groups=args.max_groups, backend=args.backend)
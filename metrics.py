@@ -0,0 +1,80 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunMetrics:
+    """Thread-safe per-stage call counts and wall time for one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stage["calls"] += count
+            stage["total_seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                name: {
+                    "calls": s["calls"],
+                    "total_seconds": round(s["total_seconds"], 3),
+                    "mean_seconds": round(s["total_seconds"] / s["calls"], 4) if s["calls"] else None,
+                    "max_seconds": round(s["max_seconds"], 3),
+                }
+                for name, s in sorted(self.stages.items())
+            }
+
+
+# Shared by every module of a run; runThis.py writes it into the JSON log
+METRICS = RunMetrics()
+
+
+def timed(name):
+    """Context manager adding the wall time of the block to stage `name` of METRICS."""
+    return METRICS.stage(name)
+
+
+@contextmanager
+def profiled(name, out_dir="log"):
+    """
+    Runs the block under cProfile when the PROFILE_STAGES environment variable lists
+    `name` (comma-separated) or is "all", and dumps the stats to out_dir/profile_<name>.prof.
+
+    cProfile only sees the calling thread. Without PROFILE_STAGES this is a no-op.
+    The hot loops are plain named functions and the pipeline threads are named, so
+    py-spy (e.g. `py-spy record --threads`) works as well.
+    """
+    wanted = {s.strip() for s in os.getenv("PROFILE_STAGES", "").split(",") if s.strip()}
+    if name not in wanted and "all" not in wanted:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"profile_{name}.prof")
+        profiler.dump_stats(path)
+        print(f"🔬 Profile for '{name}' written to {path}")
@@ -0,0 +1,188 @@
+# mock_openai_server.py
+# A local stand-in for the OpenAI chat completions endpoint, for measuring the
+# pipeline without spending API money.
+#
+# It accepts the payloads built by start_conversation_with_images (text + base64
+# image parts), answers after a configurable latency, can return 429 responses
+# with a Retry-After header, and reports plausible usage numbers.
+#
+# Usage:
+#   python mock_openai_server.py --port 8000 --latency 0.5 --rate-limit-every 10
+#   OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock python runThis.py
+
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from image_prep import estimate_image_tokens, encoded_image_size
+
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.rate_limited = 0
+        self.bad_requests = 0
+        self.bytes_received = 0
+        self.images_received = 0
+        self._lock = threading.Lock()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "bad_requests": self.bad_requests,
+                "bytes_received": self.bytes_received,
+                "images_received": self.images_received,
+            }
+
+
+def _count_prompt(messages):
+    # Returns (prompt_tokens, images) and validates every image part on the way
+    tokens = 0
+    images = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            if part["type"] == "image_url":
+                url = part["image_url"]["url"]
+                if not url.startswith("data:image/"):
+                    raise ValueError("image_url must be a base64 data URL")
+                encoded = url.split(",", 1)[1]
+                base64.b64decode(encoded, validate=True)
+                images += 1
+                # Charged by image size like the real API, so crops and mosaics show their savings
+                tokens += estimate_image_tokens(*encoded_image_size(encoded))
+            elif part["type"] == "text":
+                tokens += len(part["text"]) // 4
+            else:
+                raise ValueError(f"Unsupported content part: {part['type']}")
+    return tokens, images
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # Set on the server instance: latency, latency_per_image, rate_limit_every, retry_after, reply, stats
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        stats = server.stats
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        with stats._lock:
+            stats.requests += 1
+            stats.bytes_received += len(raw)
+            n = stats.requests
+            limited = server.rate_limit_every and n % server.rate_limit_every == 0
+            if limited:
+                stats.rate_limited += 1
+
+        if limited:
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded",
+                                            "code": "rate_limit_exceeded"}},
+                            headers={"Retry-After": str(server.retry_after)})
+            return
+
+        try:
+            body = json.loads(raw)
+            prompt_tokens, images = _count_prompt(body["messages"])
+        except (ValueError, KeyError, TypeError, OSError) as e:  # OSError: image data PIL cannot read
+            with stats._lock:
+                stats.bad_requests += 1
+            self._send_json(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+            return
+
+        with stats._lock:
+            stats.images_received += images
+
+        time.sleep(server.latency + server.latency_per_image * images)
+
+        reply = server.reply.format(request=n, images=images)
+        completion_tokens = min(len(reply) // 4 + 1, body.get("max_tokens") or 1000)
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{n}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": reply},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, headers={"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "1000000"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.2, latency_per_image=0.0, rate_limit_every=0, retry_after=1,
+                      reply="Mock reply #{request} ({images} images)."):
+    """
+    Starts the mock server on a background thread.
+
+    Parameters:
+        - host / port: address to bind (port 0 picks a free port)
+        - latency: seconds added to every successful response
+        - latency_per_image: extra seconds per image in the request
+        - rate_limit_every: answer every N-th request with 429 (0 disables)
+        - retry_after: Retry-After value (seconds) sent with 429 responses
+        - reply: reply template; {request} and {images} are filled in
+
+    Returns:
+        - server (call server.shutdown() to stop); server.base_url is the value for OPENAI_BASE_URL
+          and server.stats counts requests, 429s and bytes received
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.latency_per_image = latency_per_image
+    server.rate_limit_every = rate_limit_every
+    server.retry_after = retry_after
+    server.reply = reply
+    server.stats = MockStats()
+    server.base_url = f"http://{host}:{server.server_port}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI chat completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per response")
+    parser.add_argument("--latency-per-image", type=float, default=0.0, help="Extra seconds per image")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Return 429 on every N-th request (0 = never)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.host, args.port, args.latency, args.latency_per_image, args.rate_limit_every, args.retry_after)
+    print(f"🧪 Mock OpenAI server listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.stats.as_dict()}")
+        server.shutdown()
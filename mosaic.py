@@ -0,0 +1,158 @@
+import base64
+import io
+import math
+import os
+import re
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from image_prep import get_base64, estimate_image_tokens, encoded_image_size
+
+# Default budget: about what one 800 px high-detail image costs
+MOSAIC_TOKEN_BUDGET = 765
+
+# The API scales every image to fit 2048x2048 and then its short side to 768,
+# so a larger canvas only costs upload bytes
+_MAX_LONG_SIDE = 2048
+_MAX_SHORT_SIDE = 768
+
+# Cheapest possible image: a single 512 px tile
+MIN_MOSAIC_TOKENS = estimate_image_tokens(512, 512)
+
+
+def check_token_budget(token_budget):
+    """Raises ValueError if not even the smallest mosaic fits token_budget."""
+    if token_budget < MIN_MOSAIC_TOKENS:
+        raise ValueError(f"mosaic_tokens={token_budget} is below the cost of any image "
+                         f"({MIN_MOSAIC_TOKENS} tokens); use at least {MIN_MOSAIC_TOKENS}")
+
+
+def plan_mosaic(n_frames, frame_w, frame_h, token_budget=MOSAIC_TOKEN_BUDGET):
+    """
+    Picks the grid and tile size for n_frames frames that fits token_budget.
+
+    Every grid from 1 column to n_frames columns is tried at the largest canvas
+    whose estimated cost stays within the budget; the grid with the largest tiles wins.
+
+    Returns:
+        - dict with cols, rows, tile_w, tile_h and the estimated tokens of the mosaic
+    """
+    check_token_budget(token_budget)
+    best = None
+    for cols in range(1, n_frames + 1):
+        rows = math.ceil(n_frames / cols)
+        if cols * rows - n_frames >= cols:
+            continue  # a whole row would stay empty
+        aspect = (cols * frame_w) / (rows * frame_h)
+
+        for long_side in range(_MAX_LONG_SIDE, 63, -16):
+            width, height = (long_side, long_side / aspect) if aspect >= 1 else (long_side * aspect, long_side)
+            if min(width, height) > _MAX_SHORT_SIDE:
+                continue
+            if estimate_image_tokens(width, height) <= token_budget:
+                break
+
+        tile_w, tile_h = int(width / cols), int(height / rows)
+        if best is None or tile_w * tile_h > best["tile_w"] * best["tile_h"]:
+            best = {"cols": cols, "rows": rows, "tile_w": tile_w, "tile_h": tile_h,
+                    "tokens": estimate_image_tokens(cols * tile_w, rows * tile_h)}
+    return best
+
+
+def frame_label(path):
+    """mm:ss timestamp of a frame saved by extract_frames (<name>_<seconds>.jpg), else its file name."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = re.search(r"_(\d+)$", stem)
+    if match is None:
+        return stem
+    seconds = int(match.group(1))
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def build_mosaic(paths, plan, quality=85):
+    """Packs the frames into one JPEG grid (time order, row by row) with timestamps burned in."""
+    cols, tile_w, tile_h = plan["cols"], plan["tile_w"], plan["tile_h"]
+    sheet = Image.new("RGB", (cols * tile_w, plan["rows"] * tile_h), (0, 0, 0))
+    draw = ImageDraw.Draw(sheet)
+    font = _font(max(tile_h // 9, 10))
+
+    for i, path in enumerate(paths):
+        x, y = (i % cols) * tile_w, (i // cols) * tile_h
+        with Image.open(path) as img:
+            tile = img.convert("RGB")
+            tile.thumbnail((tile_w, tile_h), Image.Resampling.LANCZOS)
+        sheet.paste(tile, (x + (tile_w - tile.size[0]) // 2, y + (tile_h - tile.size[1]) // 2))
+        draw.rectangle((x, y, x + tile_w - 1, y + tile_h - 1), outline=(255, 255, 255), width=1)
+
+        label = frame_label(path)
+        left, top, right, bottom = draw.textbbox((x + 4, y + 2), label, font=font)
+        draw.rectangle((left - 3, top - 2, right + 3, bottom + 2), fill=(0, 0, 0))
+        draw.text((x + 4, y + 2), label, fill=(255, 255, 0), font=font)
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=64)
+def _mosaic_base64(paths, mtimes, token_budget, quality):
+    with Image.open(paths[0]) as img:
+        frame_w, frame_h = img.size
+    plan = plan_mosaic(len(paths), frame_w, frame_h, token_budget)
+    return base64.b64encode(build_mosaic(paths, plan, quality)).decode("utf-8"), plan
+
+
+def mosaic_base64(paths, token_budget=MOSAIC_TOKEN_BUDGET, quality=85):
+    """
+    Returns (base64 JPEG, plan) of the mosaic of one group.
+
+    The last few mosaics are kept in memory, so the payload report and the request
+    loop share the encoding work.
+    """
+    paths = tuple(os.path.abspath(p) for p in paths)
+    return _mosaic_base64(paths, tuple(os.stat(p).st_mtime_ns for p in paths), token_budget, quality)
+
+
+def describe_mosaic(n_frames, plan):
+    return (f"The image is a {plan['cols']}x{plan['rows']} grid of {n_frames} consecutive frames in time order "
+            f"(left to right, top to bottom). Each frame is labelled with its timestamp (mm:ss).")
+
+
+def payload_report(grouped, max_size=800, quality=85, token_budget=MOSAIC_TOKEN_BUDGET):
+    """
+    Image bytes and tokens of every group sent as separate images versus one mosaic.
+
+    Returns:
+        - dict with per-group and total before/after numbers, also printed
+    """
+    groups = []
+    for idx, group in enumerate(grouped):
+        separate = [get_base64(p, max_size, quality) for p in group]
+        encoded, plan = mosaic_base64(group, token_budget, quality)
+        groups.append({
+            "group": idx + 1,
+            "full_bytes": sum(len(e) for e in separate),
+            "mosaic_bytes": len(encoded),
+            "full_tokens": sum(estimate_image_tokens(*encoded_image_size(e)) for e in separate),
+            "mosaic_tokens": estimate_image_tokens(*encoded_image_size(encoded)),
+            "grid": f"{plan['cols']}x{plan['rows']}",
+            "tile": f"{plan['tile_w']}x{plan['tile_h']}",
+        })
+
+    report = {
+        "token_budget": token_budget,
+        "full_bytes": sum(g["full_bytes"] for g in groups),
+        "mosaic_bytes": sum(g["mosaic_bytes"] for g in groups),
+        "full_tokens": sum(g["full_tokens"] for g in groups),
+        "mosaic_tokens": sum(g["mosaic_tokens"] for g in groups),
+        "groups": groups,
+    }
+    print(f"🧩 Mosaic: {len(groups)} groups, {report['full_bytes'] / 1024:.0f} → {report['mosaic_bytes'] / 1024:.0f} KB, "
+          f"~{report['full_tokens']} → ~{report['mosaic_tokens']} image tokens")
+    return report
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """
+    One token bucket for requests per minute and one for tokens per minute.
+
+    Callers reserve capacity up front (a request plus its estimated tokens) and
+    wait until the buckets have refilled enough to cover the debt, so waiting
+    callers are served in the order they asked. Works from threads (wait) and
+    from asyncio code (acquire).
+    """
+
+    def __init__(self, requests_per_minute=20, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute) if tokens_per_minute else 0.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(self._requests + elapsed * self.requests_per_minute / 60.0, self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._tokens = min(self._tokens + elapsed * self.tokens_per_minute / 60.0, self.tokens_per_minute)
+
+    def _reserve(self, tokens):
+        # Deduct immediately (the buckets may go negative) and return how long to wait
+        with self._lock:
+            self._refill()
+            self._requests -= 1
+            delay = max(-self._requests, 0.0) * 60.0 / self.requests_per_minute
+            if self.tokens_per_minute:
+                self._tokens -= min(tokens, self.tokens_per_minute)
+                delay = max(delay, max(-self._tokens, 0.0) * 60.0 / self.tokens_per_minute)
+            self.total_wait_seconds += delay
+            return delay
+
+    def wait(self, tokens=0):
+        """Blocks until one request with the given token estimate may be sent."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            print(f"⏳ Rate limiter: waiting {delay:.1f}s")
+            time.sleep(delay)
+
+    async def acquire(self, tokens=0):
+        """Async version of wait()."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """
+        Corrects the token bucket once the real usage of a request is known.
+
+        actual_tokens is prompt plus completion (usage.total_tokens). Only what _reserve
+        deducted is refunded; a request that used more than that is charged the difference.
+        """
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        reserved = min(estimated_tokens, self.tokens_per_minute)
+        with self._lock:
+            self._tokens = min(self._tokens + reserved - actual_tokens, self.tokens_per_minute)
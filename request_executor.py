@@ -0,0 +1,201 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import openai
+from metrics import METRICS
+
+# Worth another attempt: throttling, timeouts, dropped connections and 5xx answers
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """Seconds of an x-ratelimit-reset-* value such as "1s", "6m0s" or "20ms" (None if unparseable)."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers):
+    """Seconds to wait according to retry-after-ms / Retry-After (seconds or an HTTP date), else None."""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestExecutor:
+    """
+    Sends chat completions with timeouts, retries and header-driven pacing.
+
+    - Every attempt has its own timeout.
+    - Rate limits, timeouts, connection errors and 5xx answers are retried up to
+      max_retries times with exponential backoff plus jitter; a Retry-After header
+      takes precedence over the computed delay and is honored as sent (only capped
+      at max_retry_after, against nonsense values).
+    - x-ratelimit-remaining-* / x-ratelimit-reset-* response headers are remembered:
+      when the account runs out of requests or tokens, the next request waits for the
+      reset instead of hitting a 429. A Retry-After holds back every caller, not only
+      the one that was throttled.
+
+    One instance is shared by every request of a run (EXECUTOR), from threads (create)
+    and from asyncio code (create_async). Time spent sleeping is reported by stats().
+    """
+
+    def __init__(self, max_retries=5, timeout=120.0, base_delay=1.0, max_delay=60.0, max_retry_after=900.0):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.pacing_seconds = 0.0
+        self._lock = threading.Lock()
+        self._client = None
+        self._not_before = 0.0
+        self._remaining_tokens = None
+        self._tokens_reset_at = 0.0
+
+    def _sync_client(self):
+        with self._lock:
+            if self._client is None:
+                # Retries are handled here, so the client itself must not retry as well
+                self._client = openai.OpenAI(api_key=openai.api_key, base_url=openai.base_url, max_retries=0)
+            return self._client
+
+    def _observe(self, headers):
+        if headers is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining is not None and reset and int(float(remaining)) <= 0:
+                self._not_before = max(self._not_before, now + reset)
+
+            remaining = headers.get("x-ratelimit-remaining-tokens")
+            if remaining is not None:
+                self._remaining_tokens = int(float(remaining))
+                reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                self._tokens_reset_at = now + reset if reset else 0.0
+
+    def _pacing_delay(self, tokens):
+        now = time.monotonic()
+        with self._lock:
+            delay = self._not_before - now
+            if self._remaining_tokens is not None and tokens > self._remaining_tokens and self._tokens_reset_at > now:
+                delay = max(delay, self._tokens_reset_at - now)
+                # Whoever waits for the reset gets the refilled budget; the next response tells the truth again
+                self._remaining_tokens = None
+            return max(delay, 0.0)
+
+    def _backoff_delay(self, attempt, error):
+        response = getattr(error, "response", None)
+        retry_after = parse_retry_after(getattr(response, "headers", None))
+        if retry_after is not None:
+            # Retrying before the server's time only earns another 429, so max_delay does not apply
+            delay = min(retry_after, self.max_retry_after)
+            with self._lock:
+                self._not_before = max(self._not_before, time.monotonic() + delay)
+            return delay
+        # Full jitter: a random point below the exponential cap, so parallel callers spread out
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _should_retry(self, attempt, error, label):
+        if attempt >= self.max_retries:
+            print(f"❌ {label}: giving up after {attempt + 1} attempts ({type(error).__name__})")
+            return None
+        delay = self._backoff_delay(attempt, error)
+        print(f"⚠️ {label}: {type(error).__name__}, retrying in {delay:.1f}s (attempt {attempt + 2}/{self.max_retries + 1})")
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+        METRICS.add("gpt.retry_sleep", delay)
+        return delay
+
+    def _record_pacing(self, delay):
+        print(f"⏳ Account limit reached (response headers): waiting {delay:.1f}s")
+        with self._lock:
+            self.pacing_seconds += delay
+        METRICS.add("gpt.header_pacing", delay)
+
+    def create(self, label="request", estimated_tokens=0, **kwargs):
+        """Blocking chat completion with retries; kwargs go to chat.completions.create."""
+        client = self._sync_client()
+        attempt = 0
+        while True:
+            delay = self._pacing_delay(estimated_tokens)
+            if delay > 0:
+                self._record_pacing(delay)
+                time.sleep(delay)
+            try:
+                raw = client.chat.completions.with_raw_response.create(timeout=self.timeout, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                delay = self._should_retry(attempt, e, label)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._observe(raw.headers)
+            return raw.parse()
+
+    async def create_async(self, client, label="request", estimated_tokens=0, **kwargs):
+        """Async version of create() on the given AsyncOpenAI client (created with max_retries=0)."""
+        attempt = 0
+        while True:
+            delay = self._pacing_delay(estimated_tokens)
+            if delay > 0:
+                self._record_pacing(delay)
+                await asyncio.sleep(delay)
+            try:
+                raw = await client.chat.completions.with_raw_response.create(timeout=self.timeout, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                delay = self._should_retry(attempt, e, label)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._observe(raw.headers)
+            return raw.parse()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "backoff_seconds": round(self.backoff_seconds, 2),
+                "pacing_seconds": round(self.pacing_seconds, 2),
+                "total_sleep_seconds": round(self.backoff_seconds + self.pacing_seconds, 2),
+            }
+
+
+# Shared by every request of a run; runThis.py sets timeout / max_retries and logs stats()
+EXECUTOR = RequestExecutor()
@@ -0,0 +1,125 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+
+def _normalize_messages(messages):
+    # Replace every inline image by the hash of its bytes: same key, much shorter string
+    normalized = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    data = base64.b64decode(url.split(",", 1)[1]) if url.startswith("data:") else url.encode()
+                    parts.append({"type": "image", "sha256": hashlib.sha256(data).hexdigest()})
+                else:
+                    parts.append({"type": "text", "text": part.get("text", "").strip()})
+            content = parts
+        elif isinstance(content, str):
+            content = content.strip()
+        normalized.append({"role": message["role"], "content": content})
+    return normalized
+
+
+def cache_key(model, messages, temperature, max_tokens):
+    """Content hash of everything that determines a chat completion."""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "messages": _normalize_messages(messages),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of chat completion replies keyed by cache_key().
+
+    The total size of stored replies is capped at max_bytes; the least recently
+    used entries are evicted first. Hit/miss counters are kept per instance.
+    """
+
+    def __init__(self, path=os.path.join("cache", "responses.sqlite"), max_bytes=100 * 1024 * 1024, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, content TEXT, prompt_tokens INTEGER, completion_tokens INTEGER,"
+                " size INTEGER, last_access REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, model, messages, temperature, max_tokens):
+        """Returns a response-like object for a cached reply, or None on a miss / when bypassed."""
+        if not self.enabled:
+            return None
+        key = cache_key(model, messages, temperature, max_tokens)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+
+        content, prompt_tokens, completion_tokens = row
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+        )
+
+    def put(self, model, messages, temperature, max_tokens, response):
+        """Stores the reply of a completed request and evicts old entries past the size cap."""
+        if not self.enabled:
+            return
+        key = cache_key(model, messages, temperature, max_tokens)
+        content = response.choices[0].message.content or ""
+        usage = getattr(response, "usage", None)
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, content, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+                 size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
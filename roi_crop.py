@@ -0,0 +1,147 @@
+import os
+from PIL import Image
+from detection_store import DetectionStore, STORE_FILENAME
+from image_prep import get_base64, estimate_image_tokens, encoded_image_size
+
+PAYLOAD_MODES = ("full", "roi", "roi_tiles")
+
+# Regions left after merging; beyond this the tiles are replaced by their union
+MAX_TILES = 4
+
+
+def _pad_box(box, padding, min_size, frame_w, frame_h):
+    x1, y1, x2, y2 = box
+    pad_x = (x2 - x1) * padding
+    pad_y = (y2 - y1) * padding
+    x1, y1, x2, y2 = x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y
+
+    # Grow tiny regions around their centre so GPT still gets some context
+    if x2 - x1 < min_size:
+        cx = (x1 + x2) / 2
+        x1, x2 = cx - min_size / 2, cx + min_size / 2
+    if y2 - y1 < min_size:
+        cy = (y1 + y2) / 2
+        y1, y2 = cy - min_size / 2, cy + min_size / 2
+
+    return (max(int(x1), 0), max(int(y1), 0), min(int(x2 + 0.5), frame_w), min(int(y2 + 0.5), frame_h))
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _merge_overlapping(boxes):
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if _overlaps(boxes[i], boxes[j]):
+                    boxes[i] = _union([boxes[i], boxes.pop(j)])
+                    merged = True
+                    break
+            if merged:
+                break
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+def compute_crops(folder_path, mode="roi", class_id=None, padding=0.15, min_size=96):
+    """
+    Crop regions of every frame of an extraction folder, from its detections.npz.
+
+    Parameters:
+        - folder_path: output/<trial>_<interval>s (written with export_detections)
+        - mode: "roi" (one crop around all detections) or "roi_tiles" (one crop per
+          cluster of overlapping detections, tiled into one image)
+        - class_id: list of class ids to crop to, or None for all
+        - padding: margin around each box, as a fraction of its width/height
+        - min_size: smallest crop side in pixels
+
+    Returns:
+        - dict frame path -> {"boxes": tuple of (x1, y1, x2, y2), "frame_size": (w, h)};
+          frames without detections are missing and are sent whole
+    """
+    store_path = os.path.join(folder_path, STORE_FILENAME)
+    if not os.path.exists(store_path):
+        print(f"⚠️ No {STORE_FILENAME} in {folder_path} (extract with export_detections); sending full frames.")
+        return {}
+
+    store = DetectionStore.load(store_path)
+    crops = {}
+    for index, filename in enumerate(store.filenames):
+        path = os.path.join(folder_path, filename)
+        if not os.path.exists(path):
+            continue
+        det = store.frame(index)
+        boxes = [tuple(box) for box, label in zip(det["boxes"].tolist(), det["labels"].tolist())
+                 if class_id is None or label in class_id]
+        if not boxes:
+            continue
+
+        with Image.open(path) as img:
+            frame_w, frame_h = img.size
+        padded = [_pad_box(box, padding, min_size, frame_w, frame_h) for box in boxes]
+        regions = [_union(padded)]
+        if mode == "roi_tiles":
+            tiles = _merge_overlapping(padded)
+            if len(tiles) <= MAX_TILES:
+                regions = tiles
+        crops[path] = {"boxes": tuple(regions), "frame_size": (frame_w, frame_h)}
+    return crops
+
+
+def describe_crop(index, crop):
+    """Text placed before a cropped image so GPT knows where the region sits in the frame."""
+    if crop is None:
+        return f"Frame {index}: full frame."
+    frame_w, frame_h = crop["frame_size"]
+    regions = "; ".join(f"x {x1}-{x2}, y {y1}-{y2}" for x1, y1, x2, y2 in crop["boxes"])
+    kind = "crop" if len(crop["boxes"]) == 1 else f"{len(crop['boxes'])} tiled crops (left to right, top to bottom)"
+    return f"Frame {index}: {kind} of the {frame_w}x{frame_h} frame at {regions}."
+
+
+def _payload(path, max_size, quality, crop=None):
+    encoded = get_base64(path, max_size, quality, crop=crop)
+    return len(encoded), estimate_image_tokens(*encoded_image_size(encoded))
+
+
+def payload_report(grouped, crops, max_size=800, quality=85):
+    """
+    Image bytes and tokens of every group with full frames versus crops.
+
+    Returns:
+        - dict with per-group and total before/after numbers, also printed
+    """
+    groups = []
+    for idx, group in enumerate(grouped):
+        full_bytes = full_tokens = roi_bytes = roi_tokens = 0
+        for path in group:
+            b, t = _payload(path, max_size, quality)
+            full_bytes += b
+            full_tokens += t
+            crop = crops.get(path)
+            if crop is not None:
+                b, t = _payload(path, max_size, quality, crop["boxes"])
+            roi_bytes += b
+            roi_tokens += t
+        groups.append({"group": idx + 1, "full_bytes": full_bytes, "roi_bytes": roi_bytes,
+                       "full_tokens": full_tokens, "roi_tokens": roi_tokens})
+
+    report = {
+        "frames_cropped": sum(1 for group in grouped for p in group if p in crops),
+        "frames_total": sum(len(group) for group in grouped),
+        "full_bytes": sum(g["full_bytes"] for g in groups),
+        "roi_bytes": sum(g["roi_bytes"] for g in groups),
+        "full_tokens": sum(g["full_tokens"] for g in groups),
+        "roi_tokens": sum(g["roi_tokens"] for g in groups),
+        "groups": groups,
+    }
+    print(f"✂️ ROI crops: {report['frames_cropped']}/{report['frames_total']} frames cropped, "
+          f"{report['full_bytes'] / 1024:.0f} → {report['roi_bytes'] / 1024:.0f} KB, "
+          f"~{report['full_tokens']} → ~{report['roi_tokens']} image tokens")
+    return report
@@ -13,6 +13,14 @@
 #    (메인 스크립트 실행)
 #       python runThis.py
 #
+# 3. If a run was interrupted, continue it from its journal:
+#    (중단된 실행 이어서 하기)
+#       python runThis.py --resume
+#
+# 4. Optional: cProfile the hot loops (extract, conversation, followups or all):
+#    (병목 구간 프로파일링, 결과는 log/profile_<name>.prof)
+#       PROFILE_STAGES=conversation python runThis.py
+#
 # 🪄 What this script does:
 #    - Extracts frames from a video in the ./vid folder (skips if already exists)
 #    - Sends image groups and prompts to GPT-4o for visual analysis
@@ -46,11 +54,76 @@ set_segmentation = True  # Enable segmentation masks
 # 세그멘테이션을 특정 클래스에 대해서만 적용하려면 class_id를 해당 클래스 ID의 리스트로 설정하세요
 class_id = None  # Segment all classes (default)
 
+# Export detections: keep raw frames in raw/ and every YOLO box/mask in detections.npz,
+# then render the overlays from that store. Change overlays or class_id later with
+#   python detection_store.py output/<trial>_<interval>s --class-id 0
+# without re-running YOLO.
+# 검출 결과를 detections.npz로 저장하면 YOLO를 다시 실행하지 않고 오버레이를 다시 그릴 수 있습니다
+export_detections = False
+
+# Frame sampling strategy: "auto", "sequential", "seek" or "ffmpeg"
+# "auto" decodes straight through for short intervals and seeks between keyframes for long ones
+# 프레임 샘플링 방식 (기본값 auto: 짧은 간격은 순차 디코딩, 긴 간격은 키프레임 탐색)
+sampling = "auto"
+
+# YOLO batch size and input resolution (only used when detection or segmentation is on)
+# YOLO 배치 크기와 입력 해상도 (detection/segmentation 사용 시에만 적용)
+batch_size = 8
+imgsz = 640
+
+# YOLO inference backend: "torch", "onnx" (needs onnxruntime) or "openvino" (needs openvino).
+# onnx/openvino are exported once and cached in ./models (keyed by weights hash and imgsz);
+# on CPU-only machines they start and run faster. yolo_int8 = True uses an int8-quantized export.
+# GPU가 없는 환경에서는 "onnx" 또는 "openvino"가 더 빠릅니다 (최초 1회 변환 후 ./models에 캐시)
+yolo_backend = "torch"
+yolo_int8 = False
+
+# Headless mode: never open a preview window (use on servers without a display)
+# 디스플레이가 없는 서버에서는 True로 설정하세요 (미리보기 창을 띄우지 않음)
+headless = False
+
+# -------------------------------
+# Step 2.6: Object Tracking (optional)
+# Track objects across frames locally (ByteTrack / BoT-SORT) so GPT does not have to re-identify
+# people between groups. Each group is sent with a compact summary: counts, arrivals/departures,
+# time in scene and who stands together. With send_on_change, groups whose scene composition
+# (objects per class and group sizes) did not change are not sent; their numbers are carried
+# into the next request. track_images = False sends the summaries only, without images.
+# Tracking runs on the sampled frames, so use a short interval_seconds (e.g. 1).
+# 객체를 로컬에서 추적해 인원수·체류 시간·그룹 정보를 텍스트로 보내고, 장면 구성이 바뀐 그룹만 GPT에 보냅니다
+track_objects = False
+tracker = "bytetrack.yaml"  # or "botsort.yaml"
+track_format = "text"  # "text" or "json"
+send_on_change = True
+track_images = True
+
 # -------------------------------
 # Step 3: Image Grouping & Prompt
 # Set how many images to include per prompt, and what prompt to use
 # 이미지 묶음 크기 및 GPT에게 보낼 그룹별 프롬프트 설정
 group_size = 5
+
+# Size (longest side, px) and JPEG quality of the images sent to GPT
+# GPT에 보내는 이미지의 최대 크기(px)와 JPEG 품질
+image_max_size = 800
+jpeg_quality = 85
+
+# Near-duplicate frame removal before grouping (useful for static cameras)
+# dedup_method: None (off), "dhash" (perceptual hash) or "histogram"
+# dedup_threshold: None uses the method default (4 bits for dhash, 0.1 for histogram)
+# 거의 같은 프레임은 GPT에 보내기 전에 제거합니다 (고정 카메라 영상에 유용)
+dedup_method = None
+dedup_threshold = None
+
+# What is sent for each frame: "full" (whole frame), "roi" (crop around all detections + padding)
+# or "roi_tiles" (one crop per cluster of detections, tiled into one image).
+# ROI modes need export_detections = True; frames without detections are sent whole.
+# "mosaic" packs each group into one grid image (timestamps burned in) of about mosaic_tokens tokens.
+# 감지된 영역만 잘라서 보내면 이미지 토큰이 줄어듭니다 (export_detections = True 필요)
+# "mosaic"은 그룹의 프레임을 한 장의 격자 이미지로 합쳐 보냅니다
+payload_mode = "full"
+roi_padding = 0.15
+mosaic_tokens = 765
 # group_prompt = (
 #     "You will be shown a sequence of images. These images are consecutive frames extracted from a video, maintaining their original temporal order."
 #     "There are three categories of people: 1 person == a single person, 2 people == couple, and more than or equal to three people == family/friends."
@@ -76,6 +149,42 @@ group_prompt = (
     "Your task is to observe ... "
 )
 
+# Direct handoff: frames go from the decoder straight to GPT (encoded once, in memory) while
+# the video is still being extracted. Dedup, ROI/mosaic payload modes and tracking summaries need
+# the frame folder and are not used in this mode. save_frames keeps writing the JPEGs to ./output as a side output.
+# 프레임을 디스크를 거치지 않고 바로 GPT로 보냅니다 (추출과 분석이 동시에 진행됨)
+direct_handoff = False
+save_frames = True
+
+# -------------------------------
+# Step 3.5: Conversation Context Policy
+# How much of the earlier conversation is re-sent with each image group:
+#   "full"   - every earlier image group (original behavior, cost grows quadratically)
+#   "window" - only the last `context_window` image groups and their replies
+#   "text"   - earlier groups are sent as GPT's text replies only (no images)
+#   "none"   - every group is sent on its own; groups run concurrently (up to `max_concurrency`)
+# 이전 대화를 얼마나 다시 보낼지 설정합니다 (긴 영상은 "text" 또는 "window" 권장)
+context_policy = "full"
+context_window = 3
+max_concurrency = 4
+
+# -------------------------------
+# Step 3.6: Response Cache
+# Identical requests (same model, settings, messages and images) are answered from ./cache
+# instead of being sent again. Set use_cache = False to always call the API.
+# 동일한 요청은 캐시에서 응답합니다 (API를 항상 호출하려면 False)
+use_cache = True
+cache_max_mb = 100
+
+# -------------------------------
+# Step 3.7: Request Timeouts and Retries
+# Every request is cut off after request_timeout seconds. Rate limits, timeouts, connection
+# errors and 5xx answers are retried up to max_retries times with exponential backoff
+# (honoring the API's Retry-After and x-ratelimit-* headers).
+# 요청 시간 제한과 재시도 횟수 (429/5xx/연결 오류는 점점 길게 기다리며 재시도)
+request_timeout = 120
+max_retries = 5
+
 # -------------------------------x
 # Step 4: Final Follow-Up Questions
 # After all image groups are analyzed, ask GPT some summary questions
@@ -92,25 +201,29 @@ final_questions = [
 import os
 import json
 import time
+import argparse
 from extract_frames import extract_frames
 from run_conversation import run_conversation
+from direct_conversation import run_direct_conversation
 from conversation_with_gpt import ask_followup_question
+from rate_limit import TokenBucketLimiter
+from response_cache import ResponseCache
+from run_journal import RunJournal
+from metrics import METRICS
+from request_executor import EXECUTOR
 
-# 📌 Rate Limiting Setup
-class RateLimiter:
-    def __init__(self, requests_per_minute=20):
-        self.requests_per_minute = requests_per_minute
-        self.interval = 60.0 / requests_per_minute
-        self.last_request_time = 0
+parser = argparse.ArgumentParser(description="Run the full frame extraction + GPT analysis pipeline.")
+parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its journal in ./log")
+args = parser.parse_args()
 
-    def wait(self):
-        current_time = time.time()
-        wait_time = self.interval - (current_time - self.last_request_time)
-        if wait_time > 0:
-            time.sleep(wait_time)
-        self.last_request_time = time.time()
+# 📌 Rate Limiting Setup
+# One token bucket for requests/min and tokens/min, shared by every GPT call
+rate_limiter = TokenBucketLimiter(requests_per_minute=20, tokens_per_minute=200000)  # Adjust to your account limits
+EXECUTOR.timeout = request_timeout
+EXECUTOR.max_retries = max_retries
 
-rate_limiter = RateLimiter(requests_per_minute=20)  # Adjust as needed
+# 🗄 Response cache (bypassed when use_cache is False)
+response_cache = ResponseCache(max_bytes=cache_max_mb * 1024 * 1024, enabled=use_cache)
 
 # ⏱ Execution timer start
 start_time = time.time()
@@ -122,26 +235,102 @@ folder_name = f"{trial_name}_{interval_seconds}s"
 output_path = os.path.join("output", folder_name)
 
 # 🖼 Step A: Extract frames (Skip if already exists)
-if os.path.exists(output_path):
+extraction_report = None
+if direct_handoff:
+    print("⚡ Direct handoff: frames are extracted and sent to GPT in one pass.")
+elif os.path.exists(output_path):
     print(f"📂 Found existing frame folder: {output_path}")
     print("🔁 Skipping frame extraction step.")
 else:
     print("🎞 Extracting frames...")
-    extract_frames(video_path, data_name, trial_name, interval_seconds, set_detection, set_segmentation, class_id)
+    extraction_report = extract_frames(video_path, data_name, trial_name, interval_seconds, set_detection, set_segmentation, class_id, sampling=sampling,
+                   batch_size=batch_size, imgsz=imgsz, headless=headless,
+                   export_detections=export_detections, backend=yolo_backend, int8=yolo_int8,
+                   track=track_objects, tracker=tracker)
+
+# 📓 Journal: every reply is appended to log/<trial>_journal.jsonl as soon as it arrives
+journal_config = {
+    "video_name": os.path.basename(video_path),
+    "interval_seconds": interval_seconds,
+    "group_size": group_size,
+    "group_prompt": group_prompt,
+    "context_policy": context_policy,
+    "context_window": context_window,
+    "image_max_size": image_max_size,
+    "jpeg_quality": jpeg_quality,
+    "dedup_method": dedup_method,
+    "dedup_threshold": dedup_threshold,
+    "payload_mode": payload_mode,
+    "roi_padding": roi_padding,
+    "class_id": class_id,
+    "mosaic_tokens": mosaic_tokens,
+    "direct_handoff": direct_handoff,
+    "track_format": track_format if track_objects else None,
+    "send_on_change": send_on_change,
+    "track_images": track_images,
+}
+journal_path = os.path.join("log", f"{trial_name}_journal.jsonl")
+journal = RunJournal(journal_path, journal_config, resume=args.resume)
+
+# 📦 Per-request payload bytes and token usage (filled by the conversation steps)
+usage_log = []
+dedup_report = {}
+payload_report = {}
+tracking_report = {}
 
 # 💬 Step B: Start GPT image conversation
 print("🤖 Starting GPT conversation...")
-messages, summaries = run_conversation(
-    trial_name=trial_name,
-    interval_seconds=interval_seconds,
-    group_size=group_size,
-    prompt=group_prompt,
-    rate_limiter=rate_limiter
-)
+if direct_handoff:
+    messages, summaries, extraction_report = run_direct_conversation(
+        video_path, data_name, trial_name, interval_seconds, group_size, group_prompt,
+        rate_limiter=rate_limiter,
+        context_policy=context_policy,
+        context_window=context_window,
+        usage_log=usage_log,
+        response_cache=response_cache,
+        image_max_size=image_max_size,
+        jpeg_quality=jpeg_quality,
+        journal=journal,
+        save_frames=save_frames,
+        extract_options={"detection": set_detection, "segmentation": set_segmentation, "class_id": class_id,
+                         "sampling": sampling, "batch_size": batch_size, "imgsz": imgsz,
+                         "backend": yolo_backend, "int8": yolo_int8}
+    )
+else:
+    messages, summaries = run_conversation(
+        trial_name=trial_name,
+        interval_seconds=interval_seconds,
+        group_size=group_size,
+        prompt=group_prompt,
+        rate_limiter=rate_limiter,
+        context_policy=context_policy,
+        context_window=context_window,
+        usage_log=usage_log,
+        max_concurrency=max_concurrency,
+        response_cache=response_cache,
+        image_max_size=image_max_size,
+        jpeg_quality=jpeg_quality,
+        dedup_method=dedup_method,
+        dedup_threshold=dedup_threshold,
+        dedup_report=dedup_report,
+        journal=journal,
+        payload_mode=payload_mode,
+        roi_padding=roi_padding,
+        roi_class_id=class_id,
+        payload_report=payload_report,
+        mosaic_tokens=mosaic_tokens,
+        track_format=track_format if track_objects else None,
+        send_on_change=send_on_change,
+        track_images=track_images,
+        tracking_report=tracking_report
+    )
 
 # 🧠 Step C: Ask follow-up questions
 print("\n=== Final overall analysis ===")
-answers = ask_followup_question(messages, final_questions, rate_limiter=rate_limiter)
+answers = ask_followup_question(messages, final_questions, rate_limiter=rate_limiter,
+                                context_policy=context_policy, context_window=context_window, usage_log=usage_log,
+                                response_cache=response_cache, journal=journal)
+journal.close()
 
 # 🖥 Print results to terminal
 for q, a in answers:
@@ -153,9 +342,27 @@ log_data = {
     "video_name": os.path.basename(video_path),
     "interval_seconds": interval_seconds,
     "group_size": group_size,
+    "image_max_size": image_max_size,
+    "jpeg_quality": jpeg_quality,
     "group_prompt": group_prompt,
+    "context_policy": context_policy,
+    "context_window": context_window,
     "final_questions": [q for q, _ in answers],
     "responses": [a for _, a in answers],
+    "requests": usage_log,
+    "total_payload_bytes": sum(r["payload_bytes"] for r in usage_log),
+    "total_prompt_tokens": sum(r["prompt_tokens"] or 0 for r in usage_log),
+    "total_completion_tokens": sum(r["completion_tokens"] or 0 for r in usage_log),
+    "rate_limit_wait_seconds": round(rate_limiter.total_wait_seconds, 2),
+    "request_retries": EXECUTOR.stats(),
+    "cache": response_cache.stats(),
+    "dedup": dedup_report,
+    "payload": payload_report,
+    "tracking": tracking_report,
+    "extraction": extraction_report,
+    "stage_metrics": METRICS.as_dict(),
+    "journal": journal_path,
+    "resumed": args.resume,
     "execution_time_seconds": round(time.time() - start_time, 2)
 }
 
@@ -1,6 +1,14 @@
 from conversation_with_gpt import start_conversation_with_images
+from async_conversation import start_conversation_async
+from mosaic import MOSAIC_TOKEN_BUDGET
 
-def run_conversation(trial_name: str, interval_seconds: int, group_size: int, prompt: str, rate_limiter=None):
+def run_conversation(trial_name: str, interval_seconds: int, group_size: int, prompt: str, rate_limiter=None,
+                     context_policy: str = "full", context_window: int = 3, usage_log=None, max_concurrency: int = 4,
+                     response_cache=None, image_max_size: int = 800, jpeg_quality: int = 85,
+                     dedup_method: str = None, dedup_threshold=None, dedup_report=None, journal=None,
+                     payload_mode: str = "full", roi_padding: float = 0.15, roi_class_id=None, payload_report=None,
+                     mosaic_tokens: int = MOSAIC_TOKEN_BUDGET, track_format: str = None, send_on_change: bool = True,
+                     track_images: bool = True, tracking_report=None):
     """
     Runs the full visual conversation for the given image folder.
 
@@ -10,6 +18,26 @@ def run_conversation(trial_name: str, interval_seconds: int, group_size: int, pr
         - group_size: number of images per GPT message
         - prompt: prompt for each group of images
         - rate_limiter: optional RateLimiter instance for managing API calls
+        - context_policy: "full", "window", "text" or "none" (how much history is re-sent per group)
+        - context_window: number of image groups kept by the "window" policy
+        - usage_log: optional list that receives per-request bytes and token usage
+        - max_concurrency: requests in flight at once when context_policy is "none"
+        - response_cache: optional ResponseCache so repeated requests are not paid for twice
+        - image_max_size / jpeg_quality: longest side and JPEG quality of the images sent to GPT
+        - dedup_method: "dhash" or "histogram" to drop near-duplicate frames before grouping (None = off)
+        - dedup_threshold: distance at or below which a frame counts as a duplicate (None = method default)
+        - dedup_report: optional dict that receives the skipped frame/group counts and estimated tokens saved
+        - journal: optional RunJournal for crash-safe checkpointing / resuming
+        - payload_mode: "full" frames, "roi" / "roi_tiles" crops around the detections (needs detections.npz)
+          or "mosaic" (one grid image per group)
+        - roi_padding: margin around detected boxes, as a fraction of their size
+        - roi_class_id: list of class ids to crop to, or None for all
+        - payload_report: optional dict that receives image bytes/tokens per group before and after cropping / packing
+        - mosaic_tokens: target image tokens of one mosaic (payload_mode "mosaic")
+        - track_format: "text" or "json" tracking summary with every group (needs tracks.json; None = off)
+        - send_on_change: only send groups whose tracked scene composition changed
+        - track_images: False sends the tracking summaries without any images
+        - tracking_report: optional dict that receives the groups sent / skipped
 
     Returns:
         - messages: full chat history
@@ -18,12 +46,58 @@ def run_conversation(trial_name: str, interval_seconds: int, group_size: int, pr
     folder_name = f"{trial_name}_{interval_seconds}s"
 
     # Step 1: Start conversation and build history from grouped images
-    messages, summaries = start_conversation_with_images(
-        folder_name=folder_name,
-        group_size=group_size,
-        prompt=prompt,
-        rate_limiter=rate_limiter
-    )
+    if context_policy == "none":
+        # Groups do not depend on each other, so send them concurrently
+        messages, summaries = start_conversation_async(
+            folder_name=folder_name,
+            group_size=group_size,
+            prompt=prompt,
+            rate_limiter=rate_limiter,
+            max_concurrency=max_concurrency,
+            usage_log=usage_log,
+            response_cache=response_cache,
+            image_max_size=image_max_size,
+            jpeg_quality=jpeg_quality,
+            dedup_method=dedup_method,
+            dedup_threshold=dedup_threshold,
+            dedup_report=dedup_report,
+            journal=journal,
+            payload_mode=payload_mode,
+            roi_padding=roi_padding,
+            roi_class_id=roi_class_id,
+            payload_report=payload_report,
+            mosaic_tokens=mosaic_tokens,
+            track_format=track_format,
+            send_on_change=send_on_change,
+            track_images=track_images,
+            tracking_report=tracking_report
+        )
+    else:
+        messages, summaries = start_conversation_with_images(
+            folder_name=folder_name,
+            group_size=group_size,
+            prompt=prompt,
+            rate_limiter=rate_limiter,
+            context_policy=context_policy,
+            context_window=context_window,
+            usage_log=usage_log,
+            response_cache=response_cache,
+            image_max_size=image_max_size,
+            jpeg_quality=jpeg_quality,
+            dedup_method=dedup_method,
+            dedup_threshold=dedup_threshold,
+            dedup_report=dedup_report,
+            journal=journal,
+            payload_mode=payload_mode,
+            roi_padding=roi_padding,
+            roi_class_id=roi_class_id,
+            payload_report=payload_report,
+            mosaic_tokens=mosaic_tokens,
+            track_format=track_format,
+            send_on_change=send_on_change,
+            track_images=track_images,
+            tracking_report=tracking_report
+        )
 
     # Step 2: Print all group summaries
     print("\n=== Summary per group ===")
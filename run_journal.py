@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of a conversation run.
+
+    The first line describes the run configuration; every completed group and
+    follow-up question is appended (and fsynced) as soon as its reply arrives,
+    so a crashed run can be resumed from the first missing group. Starting without
+    resume never discards a journal with replies in it: it is renamed first.
+    """
+
+    def __init__(self, path, config, resume=False):
+        self.path = path
+        self.config = config
+        self.groups = {}
+        self.followups = {}
+
+        if resume and os.path.exists(path):
+            self._load()
+            print(f"↩️ Resuming from journal {path}: {len(self.groups)} groups, {len(self.followups)} follow-ups already done")
+            self._file = open(path, "a", encoding="utf-8")
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._keep_previous()
+            self._file = open(path, "w", encoding="utf-8")
+            self._append({"type": "run", "config": config})
+
+    def _keep_previous(self):
+        # A journal with more than its header line holds paid-for replies; don't truncate it
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            f.readline()
+            if not f.readline():
+                return
+        stem, ext = os.path.splitext(self.path)
+        kept = f"{stem}.{time.strftime('%Y%m%d_%H%M%S', time.localtime(os.path.getmtime(self.path)))}{ext}"
+        os.replace(self.path, kept)
+        print(f"⚠️ {self.path} already had replies; kept it as {kept} (use --resume to continue it instead)")
+
+    def _load(self):
+        path = self.path
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        lines = content.splitlines()
+
+        torn = False
+        for line_no, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a torn last line; anything else is corruption
+                if line_no == len(lines) - 1:
+                    torn = True
+                    continue
+                raise ValueError(f"Corrupt journal line {line_no + 1} in {path}")
+
+            if record["type"] == "run":
+                if record["config"] != self.config:
+                    raise ValueError(f"Journal {path} was written with a different configuration; "
+                                     "run without --resume to start over.")
+            elif record["type"] == "group":
+                self.groups[record["index"]] = record["reply"]
+            elif record["type"] == "followup":
+                self.followups[(record["index"], record["question"])] = record["reply"]
+
+        if torn or not content.endswith("\n"):
+            # Drop a torn last line so the next append starts on a fresh line. The good lines
+            # go to a temp file first, so a crash right now cannot lose the journal.
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in (lines[:-1] if torn else lines)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def group_reply(self, index):
+        """Journaled reply of group index, or None if it still has to be sent."""
+        return self.groups.get(index)
+
+    def followup_answer(self, index, question):
+        """Journaled answer of the index-th follow-up question, or None."""
+        return self.followups.get((index, question))
+
+    def record_group(self, index, reply, usage=None):
+        self.groups[index] = reply
+        self._append({"type": "group", "index": index, "reply": reply, "usage": usage})
+
+    def record_followup(self, index, question, reply, usage=None):
+        self.followups[(index, question)] = reply
+        self._append({"type": "followup", "index": index, "question": question, "reply": reply, "usage": usage})
+
+    def close(self):
+        self._file.close()
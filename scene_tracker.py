@@ -0,0 +1,239 @@
+import json
+import os
+from collections import Counter
+
+TRACKS_FILENAME = "tracks.json"
+TRACKERS = ("bytetrack.yaml", "botsort.yaml")
+
+
+def _merge(ids, pairs):
+    # Union-find: connected components of the ids joined by pairs, largest first
+    parent = {i: i for i in ids}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs:
+        parent[find(a)] = find(b)
+    groups = {}
+    for i in ids:
+        groups.setdefault(find(i), []).append(i)
+    return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g))
+
+
+def proximity_groups(ids, boxes, proximity=1.0):
+    """
+    Groups objects standing close together in one frame.
+
+    Two objects are close when their box centers are less than proximity times their
+    mean box height apart (roughly "within one body length" for people), so the rule
+    does not depend on how far from the camera they are. Closeness is transitive.
+
+    Returns:
+        - list of sorted id lists, largest groups first
+    """
+    centers = [((x1 + x2) / 2, (y1 + y2) / 2, y2 - y1) for x1, y1, x2, y2 in boxes]
+    pairs = []
+    for a in range(len(ids)):
+        for b in range(a + 1, len(ids)):
+            (xa, ya, ha), (xb, yb, hb) = centers[a], centers[b]
+            if ((xa - xb) ** 2 + (ya - yb) ** 2) ** 0.5 < proximity * (ha + hb) / 2:
+                pairs.append((ids[a], ids[b]))
+    return _merge(ids, pairs)
+
+
+class SceneTracker:
+    """
+    Collects the tracked objects of every sampled frame and writes them to tracks.json.
+
+    update() is called in frame order with the result of model.track(..., persist=True),
+    so the ids stay the same across frames. Only classes in class_id are kept (None = all).
+    """
+
+    def __init__(self, names, tracker="bytetrack.yaml", class_id=None, proximity=1.0):
+        self.names = {int(k): v for k, v in names.items()}
+        self.tracker = tracker
+        self.class_id = class_id
+        self.proximity = proximity
+        self.frames = []
+
+    def update(self, frame_id, timestamp_sec, filename, result):
+        objects = []
+        boxes = result.boxes
+        if boxes is not None and boxes.id is not None:
+            for track_id, label, box in zip(boxes.id.int().tolist(), boxes.cls.int().tolist(), boxes.xyxy.tolist()):
+                if self.class_id is None or label in self.class_id:
+                    objects.append([track_id, label] + [round(v, 1) for v in box])
+        self.frames.append({
+            "frame_id": frame_id,
+            "t": round(timestamp_sec, 3),
+            "file": filename,
+            "objects": objects,
+            "groups": proximity_groups([o[0] for o in objects], [o[2:] for o in objects], self.proximity),
+        })
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"names": self.names, "tracker": self.tracker, "proximity": self.proximity,
+                       "frames": self.frames}, f, ensure_ascii=False)
+        n_ids = len({o[0] for frame in self.frames for o in frame["objects"]})
+        print(f"🧭 Tracked {n_ids} objects over {len(self.frames)} frames → {path}")
+
+
+def load_tracks(folder_path):
+    """tracks.json of an extraction folder, or None if the frames were extracted without tracking."""
+    path = os.path.join(folder_path, TRACKS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        tracks = json.load(f)
+    tracks["names"] = {int(k): v for k, v in tracks["names"].items()}
+    return tracks
+
+
+def _clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def _composition(frame, names):
+    # What the scene looks like, regardless of who is in it: objects per class and group sizes
+    counts = Counter(names.get(o[1], str(o[1])) for o in frame["objects"])
+    return tuple(sorted(counts.items())), tuple(sorted((len(g) for g in frame["groups"]), reverse=True))
+
+
+def track_index(tracks):
+    """First/last timestamp and class name of every id over the whole video."""
+    names = tracks["names"]
+    first_seen, last_seen, labels = {}, {}, {}
+    for frame in tracks["frames"]:
+        for o in frame["objects"]:
+            first_seen.setdefault(o[0], frame["t"])
+            last_seen[o[0]] = frame["t"]
+            labels[o[0]] = names.get(o[1], str(o[1]))
+    return {"first_seen": first_seen, "last_seen": last_seen, "labels": labels}
+
+
+def window_stats(frames, index):
+    """
+    Counts, arrivals, departures, dwell times and stable groups of a run of consecutive frames.
+
+    index: see track_index. Two ids count as a group when they were close in at least
+    half of the frames of the window in which both were visible.
+    """
+    first_seen, last_seen, labels = index["first_seen"], index["last_seen"], index["labels"]
+    start, end = frames[0]["t"], frames[-1]["t"]
+    seen = sorted({o[0] for frame in frames for o in frame["objects"]})
+    in_view = sorted(o[0] for o in frames[-1]["objects"])
+
+    together, both_visible = Counter(), Counter()
+    for frame in frames:
+        ids = sorted(o[0] for o in frame["objects"])
+        both_visible.update((a, b) for n, a in enumerate(ids) for b in ids[n + 1:])
+        together.update((a, b) for group in frame["groups"] for n, a in enumerate(group) for b in group[n + 1:])
+    groups = _merge(seen, [pair for pair, n in together.items() if n * 2 >= both_visible[pair]])
+
+    return {
+        "from": _clock(start),
+        "to": _clock(end),
+        "in_view": dict(sorted(Counter(labels[i] for i in in_view).items())),
+        "seen": dict(sorted(Counter(labels[i] for i in seen).items())),
+        "unique_so_far": dict(sorted(Counter(labels[i] for i, t in first_seen.items() if t <= end).items())),
+        "new": [i for i in seen if first_seen[i] >= start],
+        "left": {i: round(last_seen[i] - first_seen[i]) for i in seen if last_seen[i] <= end and i not in in_view},
+        "dwell": {i: round(end - first_seen[i]) for i in in_view},
+        "groups": [g for g in groups if len(g) > 1],
+        "alone": [g[0] for g in groups if len(g) == 1],
+        "labels": {i: labels[i] for i in seen},
+    }
+
+
+def format_stats(stats, track_format="text"):
+    """Compact text (or JSON) of window_stats for the prompt."""
+    if track_format == "json":
+        return json.dumps({k: v for k, v in stats.items() if k != "labels"}, separators=(",", ":"))
+
+    def counts(c):
+        return ", ".join(f"{n} {label}" for label, n in c.items()) or "none"
+
+    lines = [
+        f"Tracking {stats['from']}-{stats['to']} (ids are stable across the whole video):",
+        f"- in view at {stats['to']}: {counts(stats['in_view'])}; seen in this interval: {counts(stats['seen'])}; "
+        f"unique so far: {counts(stats['unique_so_far'])}",
+    ]
+    if stats["new"]:
+        lines.append("- new: " + ", ".join(f"#{i} {stats['labels'][i]}" for i in stats["new"]))
+    if stats["left"]:
+        lines.append("- left: " + ", ".join(f"#{i} (stayed {s}s)" for i, s in stats["left"].items()))
+    if stats["dwell"]:
+        lines.append("- time in scene: " + ", ".join(f"#{i} {s}s" for i, s in stats["dwell"].items()))
+    if stats["groups"] or stats["alone"]:
+        groups = ["+".join(f"#{i}" for i in g) for g in stats["groups"]]
+        lines.append("- together: " + ("; ".join(groups) or "nobody") +
+                     (f"; alone: {', '.join(f'#{i}' for i in stats['alone'])}" if stats["alone"] else ""))
+    return "\n".join(lines)
+
+
+def plan_tracked_groups(folder_path, grouped, track_format="text", send_on_change=True, report=None):
+    """
+    Decides which groups are sent and what tracking summary goes with each.
+
+    Every group covers the tracked frames from its first frame up to the next group's first
+    frame (frames dropped by dedup still count). With send_on_change, a group is only sent
+    when its scene composition (objects per class and group sizes, taken from the most
+    common frame of the group) differs from the last group sent; the statistics of skipped
+    groups are carried into the next request. If the last groups are skipped, their
+    statistics are still sent, as a text-only update.
+
+    Returns:
+        - list of (group paths, tracking summary, send_images) in send order, or None without tracks.json
+    """
+    tracks = load_tracks(folder_path)
+    if tracks is None:
+        print(f"⚠️ No {TRACKS_FILENAME} in {folder_path} (extract with tracking on); sending every group without tracking data.")
+        return None
+
+    frames = tracks["frames"]
+    position = {frame["file"]: n for n, frame in enumerate(frames)}
+    starts = [position.get(os.path.basename(group[0])) for group in grouped]
+    if None in starts:
+        print(f"⚠️ {TRACKS_FILENAME} does not match the frames in {folder_path}; sending every group without tracking data.")
+        return None
+    starts[0] = 0
+    index = track_index(tracks)
+
+    plan = []
+    carried_from = None
+    last_sent = None
+    for n, group in enumerate(grouped):
+        window = frames[starts[n]:starts[n + 1] if n + 1 < len(grouped) else len(frames)]
+        own = Counter(_composition(frames[position[os.path.basename(p)]], tracks["names"]) for p in group if os.path.basename(p) in position)
+        composition = own.most_common(1)[0][0] if own else None
+        window_start = carried_from if carried_from is not None else starts[n]
+
+        if not send_on_change or last_sent is None or composition != last_sent:
+            stats = window_stats(frames[window_start:starts[n] + len(window)], index)
+            plan.append((group, format_stats(stats, track_format), True))
+            last_sent = composition
+            carried_from = None
+        else:
+            carried_from = window_start
+    if carried_from is not None:
+        plan.append(([], format_stats(window_stats(frames[carried_from:], index), track_format), False))
+
+    sent_with_images = sum(1 for _, _, images in plan if images)
+    print(f"🧭 Tracking: {sent_with_images}/{len(grouped)} groups changed the scene and are sent with images"
+          f"{' (+1 text-only update)' if len(plan) > sent_with_images else ''}")
+    if report is not None:
+        report.update({
+            "groups_total": len(grouped),
+            "groups_sent": sent_with_images,
+            "text_only_updates": len(plan) - sent_with_images,
+            "requests_saved": len(grouped) - len(plan),
+            "unique_objects": dict(sorted(Counter(index["labels"].values()).items())),
+            "send_on_change": send_on_change,
+        })
+    return plan
@@ -0,0 +1,28 @@
+import os
+import sys
+import openai
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai_server import start_mock_server  # noqa: E402
+
+
+@pytest.fixture
+def mock_openai(monkeypatch):
+    """Points the OpenAI clients at a local mock server; returns a factory taking start_mock_server options."""
+    servers = []
+
+    def start(**options):
+        server = start_mock_server(latency=options.pop("latency", 0.0), **options)
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "mock")
+        monkeypatch.setattr(openai, "base_url", server.base_url)
+        monkeypatch.setattr(openai, "api_key", "mock")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
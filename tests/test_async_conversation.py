@@ -0,0 +1,26 @@
+import os
+import numpy as np
+from PIL import Image
+from run_conversation import run_conversation
+
+
+def _write_frames(folder, n):
+    os.makedirs(folder)
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        Image.fromarray(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)).save(os.path.join(folder, f"clip_{i:04d}.jpg"))
+
+
+def test_groups_keep_their_order_under_none(tmp_path, monkeypatch, mock_openai):
+    monkeypatch.chdir(tmp_path)
+    _write_frames(os.path.join("output", "clip_trial_1s"), 7)
+    # Replies take longer the more images they carry, so the short last group finishes first
+    mock_openai(latency_per_image=0.1)
+    usage_log = []
+
+    messages, summaries = run_conversation("clip_trial", 1, 3, "Describe.", context_policy="none", usage_log=usage_log)
+
+    assert [s.split("(")[1] for s in summaries] == ["3 images).", "3 images).", "1 images)."]
+    assert [entry["request"] for entry in usage_log] == ["group 1", "group 2", "group 3"]
+    assert [m["role"] for m in messages] == ["user", "assistant"] * 3
+    assert [m["content"] for m in messages[1::2]] == summaries
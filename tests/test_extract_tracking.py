@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+from extract_frames import extract_frames
+
+
+class _Array:
+    # Just enough of a torch tensor for apply_detections and SceneTracker
+    def __init__(self, values):
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+    def int(self):
+        return _Array(self.values.astype(int))
+
+    def tolist(self):
+        return self.values.tolist()
+
+
+class _Boxes:
+    xyxy = _Array(np.zeros((0, 4)))
+    conf = _Array([])
+    cls = _Array([])
+    id = None
+
+
+class _Result:
+    boxes = _Boxes()
+    masks = None
+
+
+class StubTracker:
+    names = {0: "person"}
+
+    def __init__(self):
+        self.persist = []
+
+    def track(self, image, persist=False, **kwargs):
+        self.persist.append(persist)
+        return [_Result()]
+
+
+def _write_clip(path, n_frames, fps=10):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (64, 48))
+    for i in range(n_frames):
+        writer.write(np.full((48, 64, 3), i * 10, np.uint8))
+    writer.release()
+
+
+def test_only_the_first_frame_resets_the_tracker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_clip(tmp_path / "clip.mp4", 12)
+    model = StubTracker()
+
+    extract_frames(str(tmp_path / "clip.mp4"), "clip", "clip", 0.1, model=model, track=True, batch_size=8,
+                   headless=True, sampling="sequential")
+
+    assert model.persist == [False] + [True] * 11
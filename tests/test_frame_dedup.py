@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from PIL import Image
+from frame_dedup import select_keyframes
+
+
+@pytest.fixture
+def frames(tmp_path):
+    # A frame, the same frame with a small patch changed, then a different scene
+    rng = np.random.default_rng(0)
+    scene = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    moved = scene.copy()
+    moved[:4, :4] = 0
+    other = np.full_like(scene, 30)
+    other[:, 32:] = 220
+    paths = []
+    for i, image in enumerate([scene, moved, other]):
+        path = str(tmp_path / f"clip_{i:04d}.jpg")
+        Image.fromarray(image).save(path)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("method", ["dhash", "histogram"])
+def test_near_duplicates_are_dropped(frames, method):
+    assert select_keyframes(frames, method) == [frames[0], frames[2]]
+
+
+def test_negative_threshold_keeps_everything(frames):
+    assert select_keyframes(frames, "dhash", threshold=-1) == frames
+
+
+def test_unknown_method(frames):
+    with pytest.raises(ValueError, match="Unknown dedup method"):
+        select_keyframes(frames, "ssim")
@@ -0,0 +1,21 @@
+import threading
+import cv2
+import numpy as np
+from live_stream import LiveCapture
+
+
+def test_one_frame_is_decoded_per_interval(tmp_path):
+    path = str(tmp_path / "recording.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (64, 48))
+    for i in range(90):
+        writer.write(np.full((48, 64, 3), i, np.uint8))
+    writer.release()
+    capture = LiveCapture(path, follow=True, idle_timeout=0.2, reconnect_delay=0.05)
+
+    sampled = list(capture.frames(threading.Event(), interval_sec=1.0))
+
+    # Three seconds of video: every frame is grabbed, one per second is returned
+    assert capture.frames_read == 90
+    assert len(sampled) == 3
+    assert [round(b - a, 2) for (a, _), (b, _) in zip(sampled, sampled[1:])] == [1.0, 1.0]
+    assert sampled[0][1].shape == (48, 64, 3)
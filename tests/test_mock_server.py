@@ -0,0 +1,60 @@
+import base64
+import io
+import json
+import urllib.error
+import urllib.request
+import pytest
+from PIL import Image
+
+
+def _post(server, body):
+    request = urllib.request.Request(server.base_url + "/chat/completions", data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+    return urllib.request.urlopen(request)
+
+
+def _image_part(data):
+    return {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + base64.b64encode(data).decode()}}
+
+
+def _jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_answers_with_usage_and_counts_images(mock_openai):
+    server = mock_openai()
+    image = _image_part(_jpeg(1024, 512))
+
+    with _post(server, {"model": "mock", "max_tokens": 50,
+                        "messages": [{"role": "user", "content": [{"type": "text", "text": "Describe."}, image]}]}) as r:
+        body = json.load(r)
+
+    assert body["choices"][0]["message"]["content"] == "Mock reply #1 (1 images)."
+    assert body["usage"]["total_tokens"] == body["usage"]["prompt_tokens"] + body["usage"]["completion_tokens"]
+    assert server.stats.as_dict()["images_received"] == 1
+    # Charged by size like the real API: 2x1 tiles of 512 px
+    assert body["usage"]["prompt_tokens"] == 85 + 2 * 170 + len("Describe.") // 4
+
+
+def test_unreadable_image_is_a_bad_request(mock_openai):
+    server = mock_openai()
+    message = {"model": "mock", "messages": [{"role": "user", "content": [_image_part(b"not a jpeg")]}]}
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(server, message)
+    assert error.value.code == 400
+    assert server.stats.as_dict()["bad_requests"] == 1
+
+
+def test_every_nth_request_is_rate_limited(mock_openai):
+    server = mock_openai(rate_limit_every=2, retry_after=3)
+    message = {"model": "mock", "messages": [{"role": "user", "content": "hi"}]}
+
+    _post(server, message).close()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(server, message)
+    assert error.value.code == 429
+    assert error.value.headers["Retry-After"] == "3"
+    assert server.stats.as_dict()["rate_limited"] == 1
@@ -0,0 +1,14 @@
+import pytest
+from mosaic import MIN_MOSAIC_TOKENS, plan_mosaic
+
+
+def test_plan_stays_within_budget():
+    for budget in (MIN_MOSAIC_TOKENS, 765, 1105):
+        plan = plan_mosaic(9, 1920, 1080, budget)
+        assert plan["tokens"] <= budget
+        assert plan["cols"] * plan["rows"] >= 9
+
+
+def test_budget_below_one_image_is_refused():
+    with pytest.raises(ValueError, match="mosaic_tokens=100"):
+        plan_mosaic(9, 1920, 1080, 100)
@@ -0,0 +1,47 @@
+import pytest
+from rate_limit import TokenBucketLimiter
+
+
+def test_requests_wait_once_the_burst_is_used_up():
+    limiter = TokenBucketLimiter(requests_per_minute=60)
+
+    delays = [limiter._reserve(0) for _ in range(62)]
+
+    assert delays[:60] == [0.0] * 60
+    assert delays[60] == pytest.approx(1.0, abs=0.05)
+    assert delays[61] == pytest.approx(2.0, abs=0.05)
+    assert limiter.total_wait_seconds == pytest.approx(3.0, abs=0.1)
+
+
+def test_token_budget_delays_large_requests():
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+
+    assert limiter._reserve(600) == 0.0
+    # 60 more tokens at 10 tokens/s
+    assert limiter._reserve(60) == pytest.approx(6.0, abs=0.05)
+
+
+def test_settle_returns_overestimated_tokens():
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter._reserve(600)
+    limiter.settle(600, 300)
+
+    assert limiter._reserve(300) == pytest.approx(0.0, abs=0.05)
+
+
+def test_settle_refunds_at_most_what_was_reserved():
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter._reserve(1000)  # capped: only 600 deducted
+    limiter.settle(1000, 300)
+
+    # 300 used, 300 left: 100 tokens short at 10 tokens/s
+    assert limiter._reserve(400) == pytest.approx(10.0, abs=0.05)
+
+
+def test_settle_charges_usage_above_the_estimate():
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter._reserve(100)
+    limiter.settle(100, 400)
+
+    assert limiter._reserve(200) == pytest.approx(0.0, abs=0.05)
+    assert limiter._reserve(10) == pytest.approx(1.0, abs=0.05)
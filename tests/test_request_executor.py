@@ -0,0 +1,40 @@
+import openai
+import pytest
+from request_executor import RequestExecutor, parse_duration, parse_retry_after
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_rate_limited_request_is_retried_after_retry_after(mock_openai):
+    # Every second request gets a 429: the first call succeeds, the second is retried once
+    server = mock_openai(rate_limit_every=2, retry_after=1)
+    executor = RequestExecutor(max_retries=2, max_delay=0.1)
+
+    first = executor.create(model="mock", messages=MESSAGES)
+    second = executor.create(model="mock", messages=MESSAGES)
+
+    assert first.choices[0].message.content == "Mock reply #1 (0 images)."
+    assert second.choices[0].message.content == "Mock reply #3 (0 images)."
+    assert server.stats.as_dict()["rate_limited"] == 1
+    stats = executor.stats()
+    assert stats["retries"] == 1
+    # Retry-After is honored even though it is longer than max_delay
+    assert stats["backoff_seconds"] == pytest.approx(1.0)
+
+
+def test_gives_up_after_max_retries(mock_openai):
+    server = mock_openai(rate_limit_every=1, retry_after=0)
+    executor = RequestExecutor(max_retries=1)
+
+    with pytest.raises(openai.RateLimitError):
+        executor.create(model="mock", messages=MESSAGES)
+    assert server.stats.as_dict()["requests"] == 2
+
+
+def test_parse_headers():
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("") is None
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "120"}) == 120.0
+    assert parse_retry_after({}) is None
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from response_cache import ResponseCache
+
+
+def _messages(text):
+    return [{"role": "user", "content": [{"type": "text", "text": text},
+                                         {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA"}}]}]
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                           usage=SimpleNamespace(prompt_tokens=100, completion_tokens=5))
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+
+    assert cache.get("gpt", _messages("a"), 0.3, 1000) is None
+    cache.put("gpt", _messages("a"), 0.3, 1000, _response("reply a"))
+    hit = cache.get("gpt", _messages("a "), 0.3, 1000)  # surrounding whitespace does not change the key
+    miss = cache.get("gpt", _messages("a"), 0.7, 1000)
+
+    assert hit.choices[0].message.content == "reply a"
+    assert hit.usage.prompt_tokens == 100
+    assert miss is None
+    assert cache.stats() == {"enabled": True, "hits": 1, "misses": 2}
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Room for two 6-byte replies
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=12)
+    cache.put("gpt", _messages("a"), 0.3, 1000, _response("aaaaaa"))
+    cache.put("gpt", _messages("b"), 0.3, 1000, _response("bbbbbb"))
+    cache.get("gpt", _messages("a"), 0.3, 1000)
+    cache.put("gpt", _messages("c"), 0.3, 1000, _response("cccccc"))
+
+    assert cache.get("gpt", _messages("b"), 0.3, 1000) is None
+    assert cache.get("gpt", _messages("a"), 0.3, 1000) is not None
+    assert cache.get("gpt", _messages("c"), 0.3, 1000) is not None
+    cache.close()
+
+
+def test_disabled_cache_is_bypassed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), enabled=False)
+    cache.put("gpt", _messages("a"), 0.3, 1000, _response("reply a"))
+
+    assert cache.get("gpt", _messages("a"), 0.3, 1000) is None
+    assert not (tmp_path / "responses.sqlite").exists()
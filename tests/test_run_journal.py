@@ -0,0 +1,98 @@
+import json
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from run_conversation import run_conversation
+from run_journal import RunJournal
+
+CONFIG = {"interval_seconds": 1, "group_size": 3}
+
+
+def _journal_with_two_groups(path):
+    journal = RunJournal(path, CONFIG)
+    journal.record_group(0, "first")
+    journal.record_group(1, "second")
+    journal.record_followup(0, "Who?", "nobody")
+    journal.close()
+
+
+def test_resume_restores_groups_and_followups(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_two_groups(path)
+
+    journal = RunJournal(path, CONFIG, resume=True)
+
+    assert journal.group_reply(0) == "first"
+    assert journal.group_reply(1) == "second"
+    assert journal.group_reply(2) is None
+    assert journal.followup_answer(0, "Who?") == "nobody"
+    journal.close()
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_two_groups(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "group", "index": 2, "rep')
+
+    journal = RunJournal(path, CONFIG, resume=True)
+    journal.record_group(2, "third")
+    journal.close()
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [r.get("index") for r in records if r["type"] == "group"] == [0, 1, 2]
+    assert os.listdir(tmp_path) == ["run.jsonl"]
+    assert RunJournal(path, CONFIG, resume=True).group_reply(2) == "third"
+
+
+def test_starting_over_keeps_the_old_journal(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_two_groups(path)
+
+    RunJournal(path, CONFIG).close()
+
+    kept = [p for p in os.listdir(tmp_path) if p != "run.jsonl"]
+    assert len(kept) == 1 and kept[0].startswith("run.") and kept[0].endswith(".jsonl")
+    assert RunJournal(str(tmp_path / kept[0]), CONFIG, resume=True).group_reply(1) == "second"
+    assert RunJournal(path, CONFIG, resume=True).group_reply(0) is None
+
+
+def test_torn_line_in_the_middle_is_corruption(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_two_groups(path)
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    lines[1] = lines[1][:10]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError, match="Corrupt journal line 2"):
+        RunJournal(path, CONFIG, resume=True)
+
+
+def test_resume_with_another_config_is_refused(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_two_groups(path)
+
+    with pytest.raises(ValueError, match="different configuration"):
+        RunJournal(path, dict(CONFIG, group_size=4), resume=True)
+
+
+def test_journaled_groups_are_not_sent_again(tmp_path, monkeypatch, mock_openai):
+    monkeypatch.chdir(tmp_path)
+    folder = os.path.join("output", "clip_trial_1s")
+    os.makedirs(folder)
+    rng = np.random.default_rng(0)
+    for i in range(6):
+        Image.fromarray(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)).save(os.path.join(folder, f"clip_{i:04d}.jpg"))
+    server = mock_openai()
+    journal = RunJournal(str(tmp_path / "journal.jsonl"), CONFIG)
+    journal.record_group(0, "from an earlier run")
+
+    _, summaries = run_conversation("clip_trial", 1, 3, "Describe.", context_policy="none", journal=journal)
+    journal.close()
+
+    assert summaries[0] == "from an earlier run"
+    assert server.stats.as_dict()["requests"] == 1
@@ -0,0 +1,66 @@
+import json
+import os
+import pytest
+from scene_tracker import TRACKS_FILENAME, plan_tracked_groups, proximity_groups
+
+BOXES = {1: [10, 10, 30, 60], 2: [35, 10, 55, 60], 3: [120, 10, 140, 60], 4: [60, 10, 80, 60]}
+
+
+def _visible(track_id, t):
+    return {1: t <= 20, 2: t <= 20, 3: 10 <= t <= 14, 4: t >= 22}[track_id]
+
+
+@pytest.fixture
+def tracked_folder(tmp_path):
+    # 30 frames, one per second: #1 and #2 stand together until 20s, #3 passes by at 10-14s,
+    # #4 arrives alone at 22s
+    frames = []
+    for t in range(30):
+        ids = [i for i in BOXES if _visible(i, t)]
+        frames.append({"frame_id": t, "t": t, "file": f"clip_{t:04d}.jpg",
+                       "objects": [[i, 0] + BOXES[i] for i in ids],
+                       "groups": proximity_groups(ids, [BOXES[i] for i in ids])})
+    with open(tmp_path / TRACKS_FILENAME, "w") as f:
+        json.dump({"names": {"0": "person"}, "tracker": "bytetrack.yaml", "proximity": 1.0, "frames": frames}, f)
+    grouped = [[str(tmp_path / f"clip_{t:04d}.jpg") for t in range(start, start + 3)] for start in range(0, 30, 3)]
+    return str(tmp_path), grouped
+
+
+def test_only_groups_that_change_the_scene_are_sent(tracked_folder):
+    folder, grouped = tracked_folder
+    report = {}
+
+    plan = plan_tracked_groups(folder, grouped, report=report)
+
+    sent = [group for group, _, images in plan if images]
+    assert [os.path.basename(g[0]) for g in sent] == ["clip_0000.jpg", "clip_0009.jpg", "clip_0015.jpg", "clip_0021.jpg"]
+    # The unchanged groups after 21s are summed up in a last text-only update
+    assert plan[-1][0] == [] and plan[-1][2] is False
+    assert report["groups_sent"] == 4 and report["text_only_updates"] == 1 and report["requests_saved"] == 5
+    assert report["unique_objects"] == {"person": 4}
+
+
+def test_skipped_groups_are_carried_into_the_next_summary(tracked_folder):
+    folder, grouped = tracked_folder
+
+    plan = plan_tracked_groups(folder, grouped)
+
+    # The 18s group looks like the 15s one and is skipped; the 21s group reports from 18s,
+    # including #1 and #2 leaving at 20s
+    summary = plan[3][1]
+    assert summary.startswith("Tracking 00:18-00:23")
+    assert "- new: #4 person" in summary
+    assert "#1 (stayed 20s)" in summary and "#2 (stayed 20s)" in summary
+
+
+def test_every_group_is_sent_without_send_on_change(tracked_folder):
+    folder, grouped = tracked_folder
+
+    plan = plan_tracked_groups(folder, grouped, track_format="json", send_on_change=False)
+
+    assert len(plan) == len(grouped) and all(images for _, _, images in plan)
+    assert json.loads(plan[0][1])["in_view"] == {"person": 2}
+
+
+def test_missing_tracks_file(tmp_path):
+    assert plan_tracked_groups(str(tmp_path), [[str(tmp_path / "clip_0000.jpg")]]) is None
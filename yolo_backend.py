@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+DEFAULT_WEIGHTS = "yolo11n-seg.pt"
+MODEL_CACHE = "models"
+
+# "torch" runs the .pt weights as they are; the others are exported once and cached.
+# onnx needs onnxruntime (int8: dynamic weight quantization), openvino needs openvino
+# (int8: NNCF post-training quantization, calibrated on ultralytics' default dataset).
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def weights_hash(path):
+    """Short SHA-256 of a weights file, so a retrained model never reuses a stale export."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _local_weights(weights):
+    if os.path.exists(weights):
+        return weights
+    # Official weights are downloaded on first use, as YOLO(weights) would
+    from ultralytics.utils.downloads import attempt_download_asset
+    return str(attempt_download_asset(weights))
+
+
+def exported_path(weights, backend, imgsz=640, int8=False, cache_dir=MODEL_CACHE):
+    """Cache location of an export: models/<name>_<weights hash>_<imgsz>[_int8].<onnx | openvino>."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    name = f"{stem}_{weights_hash(weights)}_{imgsz}{'_int8' if int8 else ''}"
+    return os.path.join(cache_dir, name + (".onnx" if backend == "onnx" else "_openvino_model"))
+
+
+def _quantize_onnx(path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantized = path + ".int8"
+    quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+    os.replace(quantized, path)
+
+
+def export_model(weights=DEFAULT_WEIGHTS, backend="onnx", imgsz=640, int8=False, cache_dir=MODEL_CACHE):
+    """
+    Exports weights to backend once and returns the cached path.
+
+    The export is written next to the weights by ultralytics, then moved into
+    cache_dir together with a small JSON sidecar (task, class names, export time).
+    Later calls with the same weights, imgsz and int8 flag return the cached export.
+    """
+    if backend not in BACKENDS or backend == "torch":
+        raise ValueError(f"Cannot export to backend '{backend}'; choose one of {BACKENDS[1:]}")
+    weights = _local_weights(weights)
+    path = exported_path(weights, backend, imgsz, int8, cache_dir)
+    if os.path.exists(path + ".json"):
+        return path
+
+    from ultralytics import YOLO
+    print(f"📦 Exporting {weights} to {backend} (imgsz={imgsz}{', int8' if int8 else ''}), cached in {cache_dir}/...")
+    start = time.perf_counter()
+    model = YOLO(weights)
+    if backend == "onnx":
+        # Dynamic axes so any batch size of the extraction pipeline fits
+        produced = model.export(format="onnx", imgsz=imgsz, dynamic=True, verbose=False)
+        if int8:
+            _quantize_onnx(produced)
+    else:
+        options = {"int8": True} if int8 else {}
+        produced = model.export(format="openvino", imgsz=imgsz, dynamic=True, verbose=False, **options)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    shutil.move(produced, path)
+    with open(path + ".json", "w") as f:
+        json.dump({"weights": os.path.abspath(weights), "backend": backend, "imgsz": imgsz, "int8": int8,
+                   "task": model.task, "names": model.names,
+                   "export_seconds": round(time.perf_counter() - start, 2)}, f, indent=2)
+    print(f"✅ Exported in {time.perf_counter() - start:.1f}s: {path}")
+    return path
+
+
+def load_model(weights=DEFAULT_WEIGHTS, backend="torch", imgsz=640, int8=False, cache_dir=MODEL_CACHE):
+    """
+    Loads a YOLO model for the given inference backend.
+
+    "torch" loads the weights directly. "onnx" / "openvino" load the cached export
+    (exporting first if needed); the returned object is still an ultralytics YOLO, so
+    infer_batch and the Results handling are the same for every backend. Exported models
+    run at the imgsz they were exported with.
+    """
+    from ultralytics import YOLO
+    if backend == "torch":
+        return YOLO(weights)
+    path = export_model(weights, backend, imgsz, int8, cache_dir)
+    with open(path + ".json") as f:
+        task = json.load(f)["task"]
+    return YOLO(path, task=task)